@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+"""
+Compare data.json_to_df with the previous implementation, which parsed
+each dataset twice (json.loads and pandas.read_json).
+
+    python benchmarks/bench_json_to_df.py --years 5 --columns 10
+"""
+import argparse
+import json
+import timeit
+
+import numpy
+import pandas
+
+from hydra_network_utils.data import json_to_df
+
+
+def legacy_json_to_df(json_dataframe):
+    """ The implementation of json_to_df prior to the single-pass decoder. """
+    data_dict = json.loads(json_dataframe)
+    df = pandas.read_json(json_dataframe)
+    ordered_cols = list(data_dict.keys())
+    df.index = df.index.astype(str)
+    df.columns = df.columns.astype(str)
+    df = df[ordered_cols]
+    return df
+
+
+def make_json_dataframe(years, columns):
+    index = pandas.date_range('2000-01-01', periods=365 * years, freq='D')
+    df = pandas.DataFrame(numpy.random.rand(len(index), columns),
+                          index=index.astype(str),
+                          columns=[f'col{i}' for i in range(columns)])
+    return df.to_json(orient='columns')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--years', type=int, default=5)
+    parser.add_argument('--columns', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    json_dataframe = make_json_dataframe(args.years, args.columns)
+    print(f'{args.years} years of daily data x {args.columns} columns '
+          f'({len(json_dataframe) / 1e6:.1f} MB of json)')
+
+    for name, func in (('legacy', legacy_json_to_df), ('json_to_df', json_to_df)):
+        timer = timeit.Timer(lambda: func(json_dataframe))
+        best = min(timer.repeat(repeat=args.repeat, number=1))
+        print(f'{name:>12}: {best * 1000:.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+"""
+Compare merging the end points of links into nodes with gis.NodeGrid against
+the linear scan of gis.nearby_node, as import_links_from_shapefile does with a
+node merge distance, on random straight segments.
+
+The segments' end points are spread over a square whose area grows with the
+number of segments, so the density of nodes, and the fraction of end points
+which are merged, is the same at every size.
+
+    python benchmarks/bench_node_merge.py --segments 10000 100000 1000000
+"""
+import argparse
+import time
+
+import numpy
+
+from hydra_network_utils.gis import NodeGrid, nearby_node
+
+
+def make_end_points(num_segments, distance, seed=0):
+    """ Random (first, last) end points, with about one end point per 4 merge distances squared. """
+    side = numpy.sqrt(num_segments * 2 * 4) * distance
+    return numpy.random.default_rng(seed).uniform(0, side, size=(num_segments, 2, 2)).tolist()
+
+
+def merge_with_grid(end_points, distance):
+    nodes = []
+    grid = NodeGrid(distance)
+    for segment in end_points:
+        for coordinates in segment:
+            if grid.nearest(coordinates) is None:
+                node = {'x': coordinates[0], 'y': coordinates[1]}
+                nodes.append(node)
+                grid.add(node)
+    return nodes
+
+
+def merge_with_scan(end_points, distance):
+    nodes = []
+    for segment in end_points:
+        for coordinates in segment:
+            if nearby_node(nodes, coordinates, distance) is None:
+                nodes.append({'x': coordinates[0], 'y': coordinates[1]})
+    return nodes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--segments', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--distance', type=float, default=10.0)
+    parser.add_argument('--max-scan-segments', type=int, default=5000,
+                        help='Only time the linear scan up to this many segments, as it is quadratic.')
+    args = parser.parse_args()
+
+    for num_segments in args.segments:
+        end_points = make_end_points(num_segments, args.distance)
+
+        start = time.perf_counter()
+        nodes = merge_with_grid(end_points, args.distance)
+        grid_seconds = time.perf_counter() - start
+
+        line = (f'{num_segments:>9} segments -> {len(nodes):>9} nodes: '
+                f'grid {grid_seconds:.2f}s')
+
+        if num_segments <= args.max_scan_segments:
+            start = time.perf_counter()
+            scan_nodes = merge_with_scan(end_points, args.distance)
+            line += f', linear scan {time.perf_counter() - start:.2f}s'
+            assert len(scan_nodes) == len(nodes)
+
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+"""
+Compare encoding and decoding PYWR_DATAFRAME values with data.df_to_pywr_value
+and data.pywr_value_to_df against the previous implementation, which went
+through to_json, json.loads and json.dumps to encode, and re-encoded the 'data'
+entry to json to decode it. The update of one column of an existing value, as
+an import does it with data.make_dataframe_dataset_value, is compared too.
+
+    python benchmarks/bench_pywr_dataframe.py --years 1 --columns 10
+"""
+import argparse
+import json
+import timeit
+
+import numpy
+import pandas
+
+from hydra_network_utils.data import df_to_pywr_value, json_to_df, make_dataframe_dataset_value, \
+    pywr_value_to_df
+
+
+def legacy_encode(df):
+    """ The encoding of a pywr dataframe prior to df_to_pywr_value. """
+    df.index = df.index.astype(str)
+    value = {
+        "type": "dataframeparameter",
+        "data": json.loads(df.to_json(orient='columns')),
+        "pandas_kwargs": {"parse_dates": True}
+    }
+    return json.dumps(value)
+
+
+def legacy_decode(pywr_value):
+    """ The decoding of a pywr dataframe prior to pywr_value_to_df. """
+    value = json.loads(pywr_value)
+    return json_to_df(json.dumps(value["data"]))
+
+
+def legacy_update(pywr_value, column, new_column):
+    """ The update of a column of a pywr dataframe prior to make_dataframe_dataset_value. """
+    df = legacy_decode(pywr_value)
+    df[column] = new_column
+    return legacy_encode(df)
+
+
+def make_dataframe(years, columns):
+    index = pandas.date_range('2000-01-01', periods=8760 * years, freq='h')
+    return pandas.DataFrame(numpy.random.rand(len(index), columns),
+                            index=index,
+                            columns=[f'col{i}' for i in range(columns)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--years', type=int, default=1)
+    parser.add_argument('--columns', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    df = make_dataframe(args.years, args.columns)
+    pywr_value = df_to_pywr_value(df)
+    new_column = pandas.DataFrame({'0': numpy.random.rand(len(df))}, index=df.index)
+    print(f'{args.years} years of hourly data x {args.columns} columns '
+          f'({len(pywr_value) / 1e6:.1f} MB of json)')
+
+    cases = (
+        ('legacy encode', lambda: legacy_encode(df.copy())),
+        ('df_to_pywr_value', lambda: df_to_pywr_value(df)),
+        ('legacy decode', lambda: legacy_decode(pywr_value)),
+        ('pywr_value_to_df', lambda: pywr_value_to_df(pywr_value)),
+        ('legacy update', lambda: legacy_update(pywr_value, 'col0', new_column['0'].values)),
+        ('update column', lambda: make_dataframe_dataset_value(pywr_value, new_column.copy(), 'PYWR_DATAFRAME',
+                                                               column='col0')),
+    )
+
+    for name, func in cases:
+        timer = timeit.Timer(func)
+        best = min(timer.repeat(repeat=args.repeat, number=1))
+        print(f'{name:>18}: {best * 1000:.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
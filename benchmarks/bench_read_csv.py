@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+"""
+Compare the CSV parsing options of import-dataframe-csv on a synthetic
+file of daily timeseries, one column per node.
+
+    python benchmarks/bench_read_csv.py --size-mb 1024
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy
+import pandas
+
+from hydra_network_utils import readers
+
+DATE_FORMAT = '%Y-%m-%d'
+
+
+def make_csv(filename, size_mb, columns):
+    """ Write a CSV of random values with a date index, of roughly size_mb megabytes. """
+    #each value is written as ~19 characters, with the comma
+    rows = int(size_mb * 1e6 / (columns * 19 + 11))
+    chunk_rows = 10000
+    index = pandas.date_range('1900-01-01', periods=rows, freq='D').strftime(DATE_FORMAT)
+    names = [f'node{i}' for i in range(columns)]
+
+    for start in range(0, rows, chunk_rows):
+        end = min(start + chunk_rows, rows)
+        df = pandas.DataFrame(numpy.random.rand(end - start, columns), columns=names,
+                              index=pandas.Index(index[start:end], name='date'))
+        df.to_csv(filename, mode='w' if start == 0 else 'a', header=start == 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size-mb', type=float, default=1024)
+    parser.add_argument('--columns', type=int, default=500)
+    parser.add_argument('--filename', default=None,
+                        help='Reuse this CSV if it exists, rather than writing a temporary one.')
+    args = parser.parse_args()
+
+    filename = args.filename or os.path.join(tempfile.mkdtemp(), 'bench.csv')
+    if not os.path.exists(filename):
+        make_csv(filename, args.size_mb, args.columns)
+    print(f'{filename}: {os.path.getsize(filename) / 1e6:.0f} MB')
+
+    options = [
+        ('c, inferred dates', dict(engine='c')),
+        ('c, --date-format', dict(engine='c', date_format=DATE_FORMAT)),
+        ('pyarrow, inferred dates', dict(engine='pyarrow')),
+        ('pyarrow, --date-format', dict(engine='pyarrow', date_format=DATE_FORMAT)),
+    ]
+
+    for name, kwargs in options:
+        start = time.perf_counter()
+        df = readers.read_csv(filename, index_col='date', **kwargs)
+        elapsed = time.perf_counter() - start
+        assert isinstance(df.index, pandas.DatetimeIndex)
+        print(f'{name:>24}: {elapsed:.2f} s')
+        del df
+
+    if args.filename is None:
+        os.remove(filename)
+
+
+if __name__ == '__main__':
+    main()
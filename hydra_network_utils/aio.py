@@ -0,0 +1,319 @@
+"""
+An asyncio adapter for the hydra client, and async versions of the data
+functions which make many independent requests: export_dataframes,
+assemble_dataframes and import_dataframe.
+
+The client itself is synchronous, so each request runs on a thread of a
+pool of max_concurrency threads owned by the adapter, so at most that many
+requests are in flight at once. The async functions keep a window of requests
+in flight ahead of the result they are waiting for, so the requests are
+pipelined rather than made one after another. Decoding and encoding data is
+bound by the GIL, so it is done on the event loop, rather than on the threads.
+
+The async functions make their requests through the adapter's methods, and
+only use the public helpers of the data module to build and decode what is
+sent and received.
+
+    client = get_logged_in_client(obj)
+    async with AsyncHydraClient(client, max_concurrency=8) as aclient:
+        result = await aio.import_dataframe(aclient, dataframe, network_id, scenario_id, attribute_id)
+"""
+import asyncio
+import functools
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from hydra_base.exceptions import HydraError
+from hydra_base.lib.objects import JSONObject
+
+from . import data
+
+import logging
+log = logging.getLogger(__name__)
+
+
+class AsyncHydraClient(object):
+    """
+        Wrap a synchronous hydra client (JSONConnection, or the in-process
+        client used by the tests) so its calls can be awaited. The client must
+        be safe to share between threads.
+
+        No state is tied to an event loop, so the adapter can be used by one
+        event loop after another, as long as it hasn't been closed.
+    """
+    def __init__(self, client, max_concurrency=8):
+        self.client = client
+        self.max_concurrency = max_concurrency
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.aclose()
+
+    def close(self):
+        """ Shut down the adapter's threads, waiting for the requests in flight to finish. """
+        self._executor.shutdown(wait=True)
+
+    async def aclose(self):
+        """ close, waiting on another thread, so the event loop isn't blocked. """
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+    async def run(self, func, *args, **kwargs):
+        """
+            Run a blocking function, which may make requests, on the adapter's threads.
+            If they are all busy, it waits for one to be free.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    async def get_scenario(self, scenario_id, **kwargs):
+        return await self.run(self.client.get_scenario, scenario_id, **kwargs)
+
+    async def get_nodes(self, network_id, **kwargs):
+        return await self.run(self.client.get_nodes, network_id, **kwargs)
+
+    async def get_attribute_by_id(self, attr_id, **kwargs):
+        return await self.run(self.client.get_attribute_by_id, attr_id, **kwargs)
+
+    async def get_resource_data(self, ref_key, ref_id, scenario_id, **kwargs):
+        return await self.run(self.client.get_resource_data, ref_key, ref_id, scenario_id, **kwargs)
+
+    async def get_attributes_for_resource(self, network_id, scenario_id, ref_key, ref_ids=None, **kwargs):
+        return await self.run(self.client.get_attributes_for_resource, network_id, scenario_id, ref_key,
+                              ref_ids=ref_ids, **kwargs)
+
+    async def get_resource_scenario(self, resource_attr_id, scenario_id, **kwargs):
+        return await self.run(self.client.get_resource_scenario, resource_attr_id, scenario_id, **kwargs)
+
+    async def update_nodes(self, nodes, **kwargs):
+        return await self.run(self.client.update_nodes, nodes, **kwargs)
+
+    async def update_resourcedata(self, scenario_id, resource_scenarios, **kwargs):
+        return await self.run(self.client.update_resourcedata, scenario_id, resource_scenarios, **kwargs)
+
+
+async def ordered_map(func, items, window):
+    """
+        Await func(item) for each item, with up to `window` of them in
+        flight at once, yielding the results in the order of the items.
+        An exception raised by func is raised when its result is reached.
+    """
+    pending = deque()
+    try:
+        for item in items:
+            pending.append(asyncio.ensure_future(func(item)))
+            if len(pending) >= window:
+                yield await pending.popleft()
+        while pending:
+            yield await pending.popleft()
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def prefetch_resource_data(aclient, scenario_id, attribute_ids=None, resource_type='NODE'):
+    """
+        The async version of data.prefetch_resource_data with include_data=False:
+        the resources of the scenario's network, without their data.
+    """
+    scenario = await aclient.get_scenario(scenario_id, include_data=False)
+    network_id = scenario['network_id']
+
+    if resource_type.upper() == 'NODE':
+        resources = await aclient.get_nodes(network_id)
+    else:
+        resources = await aclient.run(data.get_network_resources, aclient.client, network_id, resource_type)
+
+    return data.make_network_data(network_id, scenario_id, resources, attribute_ids, resource_type)
+
+
+async def fetch_resource_page(aclient, network_data, resources, attribute_ids):
+    """ The async version of data.fetch_resource_page. """
+    resource_scenarios = await aclient.get_attributes_for_resource(network_data.network_id,
+                                                                   network_data.scenario_id,
+                                                                   network_data.resource_type,
+                                                                   ref_ids=data.get_page_ref_ids(network_data,
+                                                                                                 resources))
+
+    return data.match_resource_data(network_data, attribute_ids, resource_scenarios)
+
+
+async def export_dataframes(aclient, network_id, scenario_id, attribute_ids=None, lookup=None,
+                            dataset_cache=None, resource_type='NODE', page_size=data.RESOURCE_PAGE_SIZE):
+    """
+        The async version of data.export_dataframes, which fetches the next page of
+        resources' data while the current page's is decoded and yielded. As in
+        data.export_dataframes, the data is fetched a page of resources at a time.
+        yields:
+            (resource name, attribute name, dataframe), in the order of the network's resources
+    """
+    if lookup is None:
+        lookup = data.AttributeLookup(aclient.client)
+
+    network_data = await prefetch_resource_data(aclient, scenario_id, attribute_ids, resource_type)
+    if network_id is not None and network_data.network_id != network_id:
+        raise ValueError(f"Scenario {scenario_id} is not in network {network_id}.")
+
+    if attribute_ids is None:
+        attribute_ids = network_data.get_attribute_ids()
+
+    async def fetch(resources):
+        resource_scenarios = await fetch_resource_page(aclient, network_data, resources, attribute_ids)
+        #The attributes are looked up here, so decoding the page doesn't make a request
+        for attr_id in sorted(set(attr_id for _, attr_id in resource_scenarios)):
+            await aclient.run(lookup.get_attribute, attr_id)
+        return resources, resource_scenarios
+
+    pages = data.iter_resource_pages(network_data, page_size=page_size)
+    async for resources, resource_scenarios in ordered_map(fetch, pages, window=2):
+        resource_scenarios = data.group_resource_scenarios(resource_scenarios)
+
+        for resource in resources:
+            resource_dataframes = data.decode_resource_dataframes(resource,
+                                                                  resource_scenarios.get(resource['id'], []),
+                                                                  lookup, dataset_cache)
+            for resource_name, attribute_name, df in resource_dataframes:
+                yield resource_name, attribute_name, df
+
+    log.info("Attribute lookups: %s", lookup.stats())
+
+
+async def assemble_dataframes(aclient, resource_attribute_ids, scenario_id, source_scenario_ids,
+                              dataset_cache=None):
+    """
+        The async version of data.assemble_dataframes, which makes the requests of up to
+        aclient.max_concurrency resource attributes at once. As with workers
+        in data.assemble_dataframes, a failure on one resource attribute doesn't
+        stop the others; the errors are raised together in a data.AssembleError.
+    """
+    resource_attribute_ids = list(resource_attribute_ids)
+    assembled_dataframes = []
+    errors = {}
+
+    cache = data.ResolutionCache(aclient.client)
+
+    async def assemble(resource_attribute_id):
+        try:
+            return await _assemble_dataframe(aclient, resource_attribute_id, scenario_id,
+                                             source_scenario_ids, cache, dataset_cache), None
+        except Exception as err:
+            log.exception("[RA %s] Unable to assemble dataframes", resource_attribute_id)
+            return None, err
+
+    results = ordered_map(assemble, resource_attribute_ids, window=aclient.max_concurrency * 2)
+    i = 0
+    async for combined_dataframe, err in results:
+        if err is not None:
+            errors[resource_attribute_ids[i]] = err
+        else:
+            assembled_dataframes.append(combined_dataframe)
+        i += 1
+
+    log.info("Lookups: %s", cache.stats())
+
+    if len(errors) > 0:
+        raise data.AssembleError(errors, assembled_dataframes)
+
+    return assembled_dataframes
+
+
+async def _assemble_dataframe(aclient, resource_attribute_id, scenario_id, source_scenario_ids, cache,
+                              dataset_cache=None):
+    source_attr_id, targets = await aclient.run(data.get_matching_resource_attributes, aclient.client,
+                                                resource_attribute_id, scenario_id, source_scenario_ids,
+                                                cache=cache)
+
+    matching_rs_list = []
+    for target_ra_id, target_scenario_id, target_network_id in targets:
+        try:
+            target_rs = await aclient.get_resource_scenario(target_ra_id, target_scenario_id)
+        except HydraError:
+            raise Exception(f"Scenario {target_scenario_id} in network"+
+                            f" {target_network_id} does not have data for"+
+                            f" attribute {source_attr_id}")
+        matching_rs_list.append(JSONObject(target_rs))
+
+    dataframes = data.extract_dataframes(matching_rs_list, dataset_cache=dataset_cache)
+    combined_dataframe = data.combine_dataframes(dataframes)
+
+    rs = JSONObject({
+        'resource_attr_id': resource_attribute_id,
+        'scenario_id': scenario_id,
+        'dataset': combined_dataframe
+    })
+    await aclient.update_resourcedata(scenario_id, [rs])
+
+    return combined_dataframe
+
+
+async def import_dataframe(aclient, dataframe, network_id, scenario_id, attribute_id, column=None,
+                           create_new=False, data_type='DATAFRAME', overwrite=False, chunk_size=100,
+                           skip_unchanged=False, network_data=None, resource_type='NODE'):
+    """
+        The async version of data.import_dataframe, which writes up to
+        aclient.max_concurrency chunks of datasets at once. The arguments and the
+        result are the same as those of data.import_dataframe.
+    """
+    start = time.perf_counter()
+
+    if network_data is None:
+        network_data = await prefetch_resource_data(aclient, scenario_id, [attribute_id], resource_type)
+        async def fetch(resources):
+            return await fetch_resource_page(aclient, network_data, resources, [attribute_id])
+
+        pages = data.iter_resource_pages(network_data)
+        async for resource_scenarios in ordered_map(fetch, pages, window=aclient.max_concurrency):
+            network_data.resource_scenarios.update(resource_scenarios)
+
+    attribute = await aclient.get_attribute_by_id(attribute_id)
+
+    #This makes a request for each resource attribute it has to create
+    node_data, skipped = await aclient.run(data.build_node_data, aclient.client, dataframe,
+                                           network_data, attribute, column=column,
+                                           create_new=create_new, data_type=data_type,
+                                           overwrite=overwrite, skip_unchanged=skip_unchanged)
+
+    chunks = data.make_chunks(node_data, chunk_size)
+
+    written, failed = data.merge_chunk_results(await asyncio.gather(*[
+        write_chunk(aclient, scenario_id, chunk, chunk_num, len(chunks))
+        for chunk_num, chunk in enumerate(chunks, 1)]))
+
+    log.info("Wrote %s datasets in %s chunks in %.2fs", len(written), len(chunks),
+             time.perf_counter() - start)
+
+    return {'written': written, 'failed': failed, 'skipped': skipped}
+
+
+async def write_chunk(aclient, scenario_id, chunk, chunk_num, num_chunks):
+    """
+        The async version of writing a chunk of (node name, data) items in
+        data.write_node_data: one request, falling back to one request per dataset if it fails.
+        returns:
+            (list, list): The names of the nodes which were written and of those which failed
+    """
+    resource_scenarios = [data.make_resource_scenario(scenario_id, node_data) for _, node_data in chunk]
+
+    try:
+        await aclient.update_resourcedata(scenario_id, resource_scenarios)
+    except Exception as err:
+        log.warning("Chunk %s/%s failed (%s). Retrying each dataset individually.",
+                    chunk_num, num_chunks, err)
+    else:
+        log.info("Chunk %s/%s: wrote %s datasets", chunk_num, num_chunks, len(chunk))
+        return [node_name for node_name, _ in chunk], []
+
+    written = []
+    failed = []
+    for (node_name, _), resource_scenario in zip(chunk, resource_scenarios):
+        try:
+            await aclient.update_resourcedata(scenario_id, [resource_scenario])
+            written.append(node_name)
+        except Exception as err:
+            log.error("Unable to write data for node %s: %s", node_name, err)
+            failed.append(node_name)
+
+    return written, failed
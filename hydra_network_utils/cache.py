@@ -0,0 +1,173 @@
+"""
+A persistent, local cache of decoded dataframes, so that exporting or
+assembling the same scenarios repeatedly doesn't decode the same datasets
+from json every time.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+import zipfile
+import numpy
+import pandas
+
+import logging
+log = logging.getLogger(__name__)
+
+
+class DatasetCache(object):
+    """
+        Decoded dataframes, stored in cache_dir as one numpy .npz archive per dataset.
+        The archives are read without unpickling anything, so a file planted in a
+        shared cache directory can't run code; it can only be a miss. Numeric
+        columns are stored as arrays, and other columns as json, so only dataframes
+        of json values, with string labels, such as those from data.json_to_df, can be cached.
+
+        Entries are keyed by the dataset's ID and its hash, so a dataset whose
+        value changes is a miss, rather than a stale hit. A dataset without a hash
+        is keyed by its modification time instead, and one with neither isn't cached.
+
+        When the files in the directory add up to more than max_size bytes, the
+        least recently used ones are deleted. A hit updates the modification time
+        of its file, which is what 'recently used' means here, so the order
+        carries over between runs and processes sharing the directory.
+    """
+    suffix = '.npz'
+
+    def __init__(self, cache_dir, max_size=1024**3):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(cache_dir, exist_ok=True)
+
+        #filename -> (last used, size in bytes)
+        self._entries = {}
+        for filename in os.listdir(cache_dir):
+            if filename.endswith(self.suffix):
+                stat = os.stat(os.path.join(cache_dir, filename))
+                self._entries[filename] = (stat.st_mtime, stat.st_size)
+        self._size = sum(size for _, size in self._entries.values())
+
+    def _get_filename(self, dataset):
+        version = dataset.get('hash')
+        if version is None:
+            version = dataset.get('cr_date')
+        if dataset.get('id') is None or version is None:
+            return None
+        return f"{dataset['id']}-{version}{self.suffix}".replace(os.sep, '_').replace(':', '_')
+
+    def get(self, dataset):
+        """ Return the cached dataframe of a dataset, or None if it isn't in the cache. """
+        filename = self._get_filename(dataset)
+        if filename is None:
+            return None
+
+        path = os.path.join(self.cache_dir, filename)
+        try:
+            df = _read_frame(path)
+            os.utime(path)
+        except (OSError, EOFError, ValueError, KeyError, zipfile.BadZipFile):
+            #Missing, deleted or left incomplete by another process, or not written by a DatasetCache
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+            if filename in self._entries:
+                size = self._entries[filename][1]
+            else:
+                #Added by another process since this cache was opened
+                size = os.path.getsize(path)
+                self._size += size
+            self._entries[filename] = (time.time(), size)
+
+        return df
+
+    def put(self, dataset, df):
+        """ Add the dataframe of a dataset to the cache. """
+        filename = self._get_filename(dataset)
+        if filename is None:
+            return
+
+        #Write to a temporary file first, so a reader never sees a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                _write_frame(f, df)
+            path = os.path.join(self.cache_dir, filename)
+            os.replace(tmp_path, path)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+
+        with self._lock:
+            if filename in self._entries:
+                self._size -= self._entries[filename][1]
+            size = os.path.getsize(path)
+            self._entries[filename] = (time.time(), size)
+            self._size += size
+            self._evict()
+
+    def _evict(self):
+        if self._size <= self.max_size:
+            return
+
+        for filename, (_, size) in sorted(self._entries.items(), key=lambda e: e[1][0]):
+            if self._size <= self.max_size:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, filename))
+            except FileNotFoundError:
+                pass
+            del self._entries[filename]
+            self._size -= size
+            log.debug("Evicted %s from the dataset cache", filename)
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries), 'bytes': self._size}
+
+
+def _write_frame(f, df):
+    """
+        Write a dataframe to an .npz archive: its index and column names as
+        strings, and each column as an array if it is numeric, or else as json.
+    """
+    arrays = {
+        'index': numpy.array([str(label) for label in df.index], dtype=str),
+        'columns': numpy.array([str(column) for column in df.columns], dtype=str),
+    }
+    for i in range(len(df.columns)):
+        values = df.iloc[:, i].to_numpy()
+        if values.dtype.kind in 'biuf':
+            arrays[f'values_{i}'] = values
+        else:
+            arrays[f'json_{i}'] = numpy.array(json.dumps(values.tolist()))
+
+    numpy.savez(f, **arrays)
+
+
+def _read_frame(path):
+    """ Read a dataframe written by _write_frame, without allowing any pickled objects. """
+    with numpy.load(path, allow_pickle=False) as archive:
+        index = pandas.Index(archive['index'].astype(object), dtype=object)
+        columns = archive['columns'].tolist()
+
+        arrays = []
+        for i in range(len(columns)):
+            if f'values_{i}' in archive.files:
+                arrays.append(archive[f'values_{i}'])
+            else:
+                values = json.loads(str(archive[f'json_{i}']))
+                array = numpy.empty(len(values), dtype=object)
+                for j, value in enumerate(values):
+                    array[j] = value
+                arrays.append(array)
+
+    df = pandas.DataFrame(dict(enumerate(arrays)), index=index)
+    df.columns = columns
+    return df
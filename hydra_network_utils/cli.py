@@ -6,9 +6,12 @@ from hydra_client.click import hydra_app, make_plugins, write_plugins
 import json
 from collections import defaultdict
 import pandas
-import re
-from .gis import import_nodes_from_shapefile, import_links_from_shapefile
+from .gis import import_nodes_from_shapefile, import_links_from_shapefile, add_nodes_from_shapefile, \
+    get_projection, ImportProgress
+from . import cache
 from . import data
+from . import export
+from . import readers
 from . import topology
 
 UPLOAD_DIR = config.get('plugin', 'upload_dir', '/tmp/uploads')
@@ -26,6 +29,11 @@ def get_logged_in_client(context, user_id=None):
     return client
 
 
+def make_progress(filename, show_progress):
+    """ Make the progress reporter of a GIS import, which prints if show_progress is set. """
+    return ImportProgress(filename, report=click.echo if show_progress else None)
+
+
 def start_cli():
     cli(obj={}, auto_envvar_prefix='HYDRA_GIS')
 
@@ -113,7 +121,16 @@ def import_links(obj):
 @click.option('--link-template-type-id', type=int, default=None)
 @click.option('--node-merge-distance', type=float, default=None)
 @click.option('-u', '--user-id', type=int, default=None)
-def import_links(obj, filename, network_id, user_id, node_template_type_id, link_template_type_id, node_merge_distance):
+@click.option('--chunk-size', type=click.IntRange(min=1), default=None,
+              help='Add the links, and the nodes they connect, this many links at a time.')
+@click.option('--progress/--quiet', default=False,
+              help='Print the number of features imported, and the rate, as the import goes.')
+@click.option('--simplify-tolerance', type=float, default=None,
+              help='Simplify the links\' layouts, removing vertices within this distance of the simplified line.')
+@click.option('--coordinate-precision', type=int, default=None,
+              help='Round the links\' layout coordinates to this many decimal places.')
+def import_links(obj, filename, network_id, user_id, node_template_type_id, link_template_type_id, node_merge_distance,
+                 chunk_size, progress, simplify_tolerance, coordinate_precision):
     """Import nodes and links from a GIS file.
 
     This app searches the GIS file for LINESTRING features. It extracts the first and last
@@ -123,8 +140,17 @@ def import_links(obj, filename, network_id, user_id, node_template_type_id, link
     """
     client = get_logged_in_client(obj, user_id=user_id)
 
-    import_links_from_shapefile(client, filename, network_id, node_template_type_id,
-                                link_template_type_id, node_merge_distance=node_merge_distance)
+    result = import_links_from_shapefile(client, filename, network_id, node_template_type_id,
+                                         link_template_type_id, node_merge_distance=node_merge_distance,
+                                         chunk_size=chunk_size, progress=make_progress(filename, progress),
+                                         simplify_tolerance=simplify_tolerance,
+                                         coordinate_precision=coordinate_precision)
+
+    print(f"Added {result['nodes']} nodes and {result['links']} links")
+    if simplify_tolerance is not None or coordinate_precision is not None:
+        reduction = 1 - result['after'] / result['before'] if result['before'] > 0 else 0
+        print(f"Link layouts: {result['before']} bytes before, {result['after']} bytes after "
+              f"({reduction:.0%} smaller)")
 
 
 @hydra_app(category='network_utility', name='Import nodes from GIS')
@@ -137,7 +163,15 @@ def import_links(obj, filename, network_id, user_id, node_template_type_id, link
 @click.option('-a', '--node-name-attribute', type=str, default=None, multiple=True)
 @click.option('--node-template-type-id', type=int, default=None)
 @click.option('-u', '--user-id', type=int, default=None)
-def import_nodes(obj, filename, network_id, user_id, node_template_type_id, node_name_attribute):
+@click.option('--chunk-size', type=click.IntRange(min=1), default=None,
+              help='Read the file lazily and add the nodes this many at a time.')
+@click.option('--batch-size', type=click.IntRange(min=1), default=None,
+              help='Compute the polygons\' representative points this many features at a time, '
+                   'in one vectorised step.')
+@click.option('--progress/--quiet', default=False,
+              help='Print the number of features imported, and the rate, as the import goes.')
+def import_nodes(obj, filename, network_id, user_id, node_template_type_id, node_name_attribute, chunk_size,
+                 batch_size, progress):
     """Import nodes from a GIS file.
 
     This app searches a GIS file for POINT, POLYGON or MULTIPOLYGON features. It creates a new
@@ -146,8 +180,17 @@ def import_nodes(obj, filename, network_id, user_id, node_template_type_id, node
     """
     client = get_logged_in_client(obj, user_id=user_id)
 
+    progress = make_progress(filename, progress)
+
+    if chunk_size is not None:
+        add_nodes_from_shapefile(client, filename, network_id, node_template_type_id,
+                                 name_attributes=node_name_attribute, chunk_size=chunk_size,
+                                 batch_size=batch_size, progress=progress)
+        return
+
     nodes, projection = import_nodes_from_shapefile(filename, node_template_type_id,
-                                                    name_attributes=node_name_attribute)
+                                                    name_attributes=node_name_attribute,
+                                                    batch_size=batch_size, progress=progress)
 
     client.add_nodes(network_id, nodes)
 
@@ -164,8 +207,15 @@ def import_nodes(obj, filename, network_id, user_id, node_template_type_id, node
 @click.option('--node-name-attribute', type=str, default=None)
 @click.option('--node-template-type-id', type=int, default=None)
 @click.option('--network-template-type-id', type=int, default=None)
+@click.option('--chunk-size', type=click.IntRange(min=1), default=None,
+              help='Create the network empty, then add the nodes this many at a time.')
+@click.option('--batch-size', type=click.IntRange(min=1), default=None,
+              help='Compute the polygons\' representative points this many features at a time, '
+                   'in one vectorised step.')
+@click.option('--progress/--quiet', default=False,
+              help='Print the number of features imported, and the rate, as the import goes.')
 def import_network(obj, filename, project_id, name, user_id, node_template_type_id,
-                   network_template_type_id, node_name_attribute):
+                   network_template_type_id, node_name_attribute, chunk_size, batch_size, progress):
     """Create a new network from a GIS file.
 
     This app searches a GIS file for POINT, POLYGON or MULTIPOLYGON features. It creates a new
@@ -175,8 +225,15 @@ def import_network(obj, filename, project_id, name, user_id, node_template_type_
     """
     client = get_logged_in_client(obj, user_id=user_id)
 
-    nodes, projection = import_nodes_from_shapefile(filename, node_template_type_id,
-                                                    name_attributes=[node_name_attribute])
+    progress = make_progress(filename, progress)
+
+    if chunk_size is not None:
+        nodes = []
+        projection = get_projection(filename)
+    else:
+        nodes, projection = import_nodes_from_shapefile(filename, node_template_type_id,
+                                                        name_attributes=[node_name_attribute],
+                                                        batch_size=batch_size, progress=progress)
 
     if name is None:
         name, _ = os.path.splitext(os.path.basename(filename))
@@ -194,7 +251,12 @@ def import_network(obj, filename, project_id, name, user_id, node_template_type_
         'types': [{'id': network_template_type_id}]
     }
 
-    client.add_network(network)
+    network = client.add_network(network)
+
+    if chunk_size is not None:
+        add_nodes_from_shapefile(client, filename, network['id'], node_template_type_id,
+                                 name_attributes=[node_name_attribute], chunk_size=chunk_size,
+                                 batch_size=batch_size, progress=progress)
 
 @hydra_app(category='network_utility', name='Export Coordinates')
 @cli.command(name='export-coordinates', context_settings=dict(
@@ -222,14 +284,16 @@ def export_coordinates(obj, network_id, data_dir, user_id):
 @click.option('--filename', type=click.Path(file_okay=True, dir_okay=False))
 @click.option('-n', '--network-id', type=int, default=None, multiple=True)
 @click.option('-u', '--user-id', type=int, default=None)
-def apply_coordinates(obj, filename, network_id, user_id):
+@click.option('--engine', type=click.Choice(['c', 'python', 'pyarrow']), default=None,
+              help='The CSV parser. pyarrow is multithreaded.')
+def apply_coordinates(obj, filename, network_id, user_id, engine):
     """Apply layouts from JSON file to network."""
     client = get_logged_in_client(obj, user_id=user_id)
 
     if not hasattr(network_id, '__iter__'):
         network_id = [network_id]
 
-    topology.apply_coordinates(client, filename, network_id)
+    topology.apply_coordinates(client, filename, network_id, engine=engine)
 
     print("Done applying coordinates")
 
@@ -299,9 +363,22 @@ def apply_layouts(obj, filename, network_id, user_id):
 @click.option('-s', '--scenario-id', type=int, default=None)
 @click.option('-a', '--attribute-id', type=int, default=None)
 @click.option('-u', '--user-id', type=int, default=None)
+@click.option('--chunk-size', type=click.IntRange(min=1), default=100)
+@click.option('--skip-unchanged/--no-skip-unchanged', default=False,
+              help='Only write datasets whose value has changed.')
+@click.option('--sheet-attribute', type=str, multiple=True,
+              help='SHEET=ATTRIBUTE: import a sheet into an attribute, given by name or ID. '
+                   'Can be used several times.')
+@click.option('--all-sheets', is_flag=True, default=False,
+              help='Import every sheet into the attribute with the same name as the sheet.')
+@click.option('--header-levels', type=click.IntRange(1, 3), default=1,
+              help='2 for (node, attribute) column headers, or 3 for (node, attribute, column).')
+@click.option('--resource-type', type=click.Choice(data.RESOURCE_TYPES, case_sensitive=False), default='NODE',
+              help='The type of resource named by the column headers.')
 def import_dataframe_excel(obj, filename, column, sheet_name, index_col, data_type,
                            create_new, overwrite,
-                           network_id, scenario_id, attribute_id, user_id):
+                           network_id, scenario_id, attribute_id, user_id, chunk_size,
+                           skip_unchanged, sheet_attribute, all_sheets, header_levels, resource_type):
     """Import dataframes from Excel."""
 
     client = get_logged_in_client(obj, user_id=user_id)
@@ -312,17 +389,42 @@ def import_dataframe_excel(obj, filename, column, sheet_name, index_col, data_ty
     except:
         pass
 
+    if sheet_attribute or all_sheets:
+        if network_id is None:
+            network_id = client.get_scenario(scenario_id, include_data=False)['network_id']
+        dataframes = read_sheet_attributes(client, filename, index_col, sheet_attribute, all_sheets,
+                                           network_id=network_id)
+        result = data.import_dataframes(client, dataframes, scenario_id, column=column,
+                                        create_new=create_new, data_type=data_type, overwrite=overwrite,
+                                        chunk_size=chunk_size, skip_unchanged=skip_unchanged,
+                                        resource_type=resource_type)
+        print_import_result(result)
+        return
+
+    header = list(range(header_levels)) if header_levels > 1 else 0
+
     if filename.endswith('csv'):
-        dataframe = pandas.read_csv(filename, index_col=index_col, parse_dates=True)
+        dataframe = pandas.read_csv(filename, index_col=index_col, parse_dates=True, header=header)
     elif filename.endswith('xlsx') or filename.endswith('xls'):
-        dataframe = pandas.read_excel(filename, sheet_name=sheet_name, index_col=index_col, parse_dates=True)
+        dataframe = pandas.read_excel(filename, sheet_name=sheet_name, index_col=index_col, parse_dates=True,
+                                      header=header)
         if isinstance(dataframe, dict):
             dataframe = list(dataframe.values())[0]
     else:
         raise Exception("Unrecognised file extention. Must be csv or xlsx.")
 
-    data.import_dataframe(client, dataframe, network_id, scenario_id, attribute_id, column,
-                          create_new=create_new, data_type=data_type, overwrite=overwrite)
+    if header_levels > 1:
+        result = data.import_multiindex_dataframe(client, dataframe, scenario_id, column=column,
+                                                  create_new=create_new, data_type=data_type,
+                                                  overwrite=overwrite, chunk_size=chunk_size,
+                                                  skip_unchanged=skip_unchanged, resource_type=resource_type)
+    else:
+        result = data.import_dataframe(client, dataframe, network_id, scenario_id, attribute_id, column,
+                                       create_new=create_new, data_type=data_type, overwrite=overwrite,
+                                       chunk_size=chunk_size, skip_unchanged=skip_unchanged,
+                                       resource_type=resource_type)
+
+    print_import_result(result)
 
 
 @hydra_app(category='network_utility', name='Import dataframes from CSV')
@@ -340,19 +442,126 @@ def import_dataframe_excel(obj, filename, column, sheet_name, index_col, data_ty
 @click.option('-a', '--attribute-id', type=int, default=None)
 @click.option('-u', '--user-id', type=int, default=None)
 @click.option('-u', '--user-id', type=int, default=None)
+@click.option('--chunk-size', type=click.IntRange(min=1), default=100)
+@click.option('--skip-unchanged/--no-skip-unchanged', default=False,
+              help='Only write datasets whose value has changed.')
+@click.option('--column-group-size', type=click.IntRange(min=1), default=None,
+              help='Read and import the file this many node columns at a time.')
+@click.option('--engine', type=click.Choice(['c', 'python', 'pyarrow']), default=None,
+              help='The CSV parser. pyarrow is multithreaded.')
+@click.option('--date-format', type=str, default=None,
+              help='The strftime format of the index, e.g. %Y-%m-%d, to avoid inferring it row by row.')
+@click.option('--header-levels', type=click.IntRange(1, 3), default=1,
+              help='2 for (node, attribute) column headers, or 3 for (node, attribute, column).')
+@click.option('--resource-type', type=click.Choice(data.RESOURCE_TYPES, case_sensitive=False), default='NODE',
+              help='The type of resource named by the column headers.')
 def import_dataframe_csv(obj, filename, column, index_col, create_new, overwrite,
-                         network_id, scenario_id, attribute_id, user_id, ):
+                         network_id, scenario_id, attribute_id, user_id, chunk_size,
+                         skip_unchanged, column_group_size, engine, date_format, header_levels,
+                         resource_type):
     """Import dataframes from CSV."""
     client = get_logged_in_client(obj, user_id=user_id)
-    dataframe = pandas.read_csv(filename, index_col=index_col, parse_dates=True)
-    data.import_dataframe(client,
-                          dataframe,
-                          network_id,
-                          scenario_id,
-                          attribute_id,
-                          column,
-                          create_new=create_new,
-                          overwrite=overwrite)
+
+    if header_levels > 1:
+        if column_group_size is not None:
+            raise click.BadParameter('--column-group-size can only be used with one header row.')
+        dataframe = readers.read_csv(filename, index_col=index_col, engine=engine, date_format=date_format,
+                                     header=list(range(header_levels)))
+        result = data.import_multiindex_dataframe(client, dataframe, scenario_id, column=column,
+                                                  create_new=create_new, overwrite=overwrite,
+                                                  chunk_size=chunk_size, skip_unchanged=skip_unchanged,
+                                                  resource_type=resource_type)
+        print_import_result(result)
+        return
+
+    if column_group_size is not None:
+        dataframes = readers.iter_csv_column_groups(filename, column_group_size, index_col=index_col,
+                                                    engine=engine, date_format=date_format)
+        result = data.import_dataframe_groups(client,
+                                              dataframes,
+                                              network_id,
+                                              scenario_id,
+                                              attribute_id,
+                                              column=column,
+                                              create_new=create_new,
+                                              overwrite=overwrite,
+                                              chunk_size=chunk_size,
+                                              skip_unchanged=skip_unchanged,
+                                              resource_type=resource_type)
+        print_import_result(result)
+        return
+
+    dataframe = readers.read_csv(filename, index_col=index_col, engine=engine, date_format=date_format)
+    result = data.import_dataframe(client,
+                                   dataframe,
+                                   network_id,
+                                   scenario_id,
+                                   attribute_id,
+                                   column,
+                                   create_new=create_new,
+                                   overwrite=overwrite,
+                                   chunk_size=chunk_size,
+                                   skip_unchanged=skip_unchanged,
+                                   resource_type=resource_type)
+
+    print_import_result(result)
+
+
+def read_sheet_attributes(client, filename, index_col, sheet_attributes, all_sheets, network_id=None):
+    """
+        Read the sheets of a workbook, in one pass, for import into the
+        attributes they are mapped to. Attribute names are looked up among
+        the attributes of network_id, as in data.get_attribute_ids.
+        returns:
+            dict: The sheets' dataframes, keyed on attribute ID
+    """
+    sheet_names = {}
+    for mapping in sheet_attributes:
+        if '=' not in mapping:
+            raise click.BadParameter(f'"{mapping}" should be SHEET=ATTRIBUTE', param_hint='--sheet-attribute')
+        sheet, attribute = mapping.split('=', 1)
+        sheet_names[sheet] = attribute
+
+    if all_sheets:
+        sheets = pandas.read_excel(filename, sheet_name=None, index_col=index_col, parse_dates=True)
+        for sheet in sheets:
+            sheet_names.setdefault(sheet, sheet)
+    else:
+        sheets = pandas.read_excel(filename, sheet_name=list(sheet_names), index_col=index_col,
+                                   parse_dates=True)
+
+    attribute_ids = data.get_attribute_ids(client, set(sheet_names.values()), network_id=network_id)
+
+    dataframes = {}
+    for sheet, attribute in sheet_names.items():
+        attribute_id = attribute_ids[attribute]
+        if attribute_id in dataframes:
+            raise click.BadParameter(f'More than one sheet is mapped to attribute "{attribute}"')
+        dataframes[attribute_id] = sheets[sheet]
+
+    return dataframes
+
+
+def print_import_result(result):
+    """ Summarise the result of a dataframe import. """
+    print(f"Data written to {len(result['written'])} nodes")
+    if len(result['skipped']) > 0:
+        print(f"Data unchanged on {len(result['skipped'])} nodes")
+    if len(result['failed']) > 0:
+        print(f"Unable to write data to {len(result['failed'])} nodes: {', '.join(result['failed'])}")
+
+
+def get_dataset_cache(cache_dir, cache_size):
+    """ Open the dataset cache in cache_dir, if one is given. cache_size is in MB. """
+    if cache_dir is None:
+        return None
+    return cache.DatasetCache(cache_dir, max_size=cache_size * 1024**2)
+
+
+def print_dataset_cache_stats(dataset_cache):
+    if dataset_cache is not None:
+        stats = dataset_cache.stats()
+        print(f"Dataset cache: {stats['hits']} hits, {stats['misses']} misses")
 
 
 @hydra_app(category='network_utility', name='Export dataframes to Excel')
@@ -365,7 +574,18 @@ def import_dataframe_csv(obj, filename, column, index_col, create_new, overwrite
 @click.option('-a', '--attribute-id', type=int, default=None)
 @click.option('-u', '--user-id', type=int, default=None)
 @click.option('--data-dir', default='/tmp')
-def export_dataframes_excel(obj, network_id, scenario_id, attribute_id, user_id, data_dir):
+@click.option('--workers', type=click.IntRange(min=1), default=None,
+              help='Fetch this many pages of data at once, while the dataframes are decoded.')
+@click.option('--streaming/--no-streaming', default=False,
+              help='Write each dataframe to disk as it is exported, rather than holding them all in memory.')
+@click.option('--cache-dir', type=click.Path(file_okay=False), default=None,
+              help='Keep decoded datasets in this directory, to reuse in later runs.')
+@click.option('--cache-size', type=int, default=1024,
+              help='The maximum size of the dataset cache, in MB.')
+@click.option('--resource-type', type=click.Choice(data.RESOURCE_TYPES, case_sensitive=False), default='NODE',
+              help='The type of resource whose data is exported.')
+def export_dataframes_excel(obj, network_id, scenario_id, attribute_id, user_id, data_dir, workers,
+                            streaming, cache_dir, cache_size, resource_type):
     """Export dataframes to Excel."""
     client = get_logged_in_client(obj, user_id=user_id)
 
@@ -373,19 +593,87 @@ def export_dataframes_excel(obj, network_id, scenario_id, attribute_id, user_id,
     if attribute_id is not None:
         attribute_ids = [attribute_id]
 
-    dataframes = defaultdict(dict)
-    for node_name, attr_name, df in data.export_dataframes(client, network_id, scenario_id, attribute_ids=attribute_ids):
-        dataframes[attr_name][node_name] = df
+    lookup = data.AttributeLookup(client)
+
+    dataset_cache = get_dataset_cache(cache_dir, cache_size)
+
+    exported_dataframes = data.export_dataframes(client, network_id, scenario_id,
+                                                 attribute_ids=attribute_ids, lookup=lookup,
+                                                 workers=workers, dataset_cache=dataset_cache,
+                                                 resource_type=resource_type)
 
     # TODO make the filename configurable or based on the network name
     fn = os.path.join(data_dir, 'export.xlsx')
-    writer = pandas.ExcelWriter(fn)
-    for key, dfs in dataframes.items():
-        df = pandas.concat(dfs, axis=1)
-        # replace non-alphanumeric characters with underscore
-        sheet_name = re.sub('[^0-9a-zA-Z|+\-@#$^()_,.!]+', '_', key)
-        df.to_excel(writer, sheet_name=sheet_name)
-    writer.save()
+
+    if streaming:
+        with export.StreamingExcelWriter(fn, tmp_dir=data_dir) as writer:
+            for node_name, attr_name, df in exported_dataframes:
+                writer.add(node_name, attr_name, df)
+    else:
+        dataframes = defaultdict(dict)
+        for node_name, attr_name, df in exported_dataframes:
+            dataframes[attr_name][node_name] = df
+
+        writer = pandas.ExcelWriter(fn)
+        for key, dfs in dataframes.items():
+            df = pandas.concat(dfs, axis=1)
+            df.to_excel(writer, sheet_name=export.make_sheet_name(key))
+        writer.save()
+
+    for name, stats in lookup.stats().items():
+        print(f"{name} lookups: {stats['hits']} hits, {stats['misses']} misses")
+    print_dataset_cache_stats(dataset_cache)
+
+@hydra_app(category='network_utility', name='Export dataframes to Parquet or Arrow')
+@cli.command(name='export-dataframes-columnar', context_settings=dict(
+    ignore_unknown_options=True,
+    allow_extra_args=True))
+@click.pass_obj
+@click.option('-n', '--network-id', type=int, default=None)
+@click.option('-s', '--scenario-id', type=int, default=None)
+@click.option('-a', '--attribute-id', type=int, default=None)
+@click.option('-u', '--user-id', type=int, default=None)
+@click.option('--data-dir', default='/tmp')
+@click.option('--format', 'file_format', type=click.Choice(['parquet', 'arrow']), default='parquet')
+@click.option('--compression', type=str, default=None,
+              help='e.g. snappy, gzip or zstd for parquet; lz4 or zstd for arrow.')
+@click.option('--row-group-size', type=int, default=1000000)
+@click.option('--workers', type=click.IntRange(min=1), default=None,
+              help='Fetch this many pages of data at once, while the dataframes are decoded.')
+@click.option('--cache-dir', type=click.Path(file_okay=False), default=None,
+              help='Keep decoded datasets in this directory, to reuse in later runs.')
+@click.option('--cache-size', type=int, default=1024,
+              help='The maximum size of the dataset cache, in MB.')
+@click.option('--resource-type', type=click.Choice(data.RESOURCE_TYPES, case_sensitive=False), default='NODE',
+              help='The type of resource whose data is exported.')
+def export_dataframes_columnar(obj, network_id, scenario_id, attribute_id, user_id, data_dir,
+                               file_format, compression, row_group_size, workers, cache_dir, cache_size,
+                               resource_type):
+    """Export dataframes to a Parquet dataset or an Arrow file, in long format:
+    one row per (node, attribute, index, column) value.
+    """
+    client = get_logged_in_client(obj, user_id=user_id)
+
+    attribute_ids = None
+    if attribute_id is not None:
+        attribute_ids = [attribute_id]
+
+    dataset_cache = get_dataset_cache(cache_dir, cache_size)
+
+    exported_dataframes = data.export_dataframes(client, network_id, scenario_id,
+                                                 attribute_ids=attribute_ids, workers=workers,
+                                                 dataset_cache=dataset_cache, resource_type=resource_type)
+
+    # TODO make the filename configurable or based on the network name
+    fn = os.path.join(data_dir, f'export.{file_format}')
+
+    with export.ColumnarWriter(fn, format=file_format, compression=compression,
+                               row_group_size=row_group_size) as writer:
+        for node_name, attr_name, df in exported_dataframes:
+            writer.add(node_name, attr_name, df)
+
+    print(f"Dataframes exported to {fn}")
+    print_dataset_cache_stats(dataset_cache)
 
 @hydra_app(category='network_utility', name='Combine dataframes from multiple networks at once')
 @cli.command(name='assemble-dataframes', context_settings=dict(
@@ -396,7 +684,14 @@ def export_dataframes_excel(obj, network_id, scenario_id, attribute_id, user_id,
 @click.option('-s', '--scenario-id', type=int, default=None)
 @click.option('-t', '--source-scenario-ids', type=int, default=None, multiple=True)
 @click.option('-u', '--user-id', type=int, default=None)
-def assemble_dataframes(obj, resource_attribute_ids, scenario_id, source_scenario_ids, user_id):
+@click.option('--workers', type=int, default=None,
+              help='Assemble this many resource attributes at once.')
+@click.option('--cache-dir', type=click.Path(file_okay=False), default=None,
+              help='Keep decoded datasets in this directory, to reuse in later runs.')
+@click.option('--cache-size', type=int, default=1024,
+              help='The maximum size of the dataset cache, in MB.')
+def assemble_dataframes(obj, resource_attribute_ids, scenario_id, source_scenario_ids, user_id, workers,
+                        cache_dir, cache_size):
     """
         Create a single data frame into a resource attribute by finding
         equivalent resource attributes on other specified networks (identified through
@@ -404,7 +699,12 @@ def assemble_dataframes(obj, resource_attribute_ids, scenario_id, source_scenari
     """
     client = get_logged_in_client(obj, user_id=user_id)
 
-    data.assemble_dataframes(client, resource_attribute_ids, scenario_id, source_scenario_ids)
+    dataset_cache = get_dataset_cache(cache_dir, cache_size)
+
+    data.assemble_dataframes(client, resource_attribute_ids, scenario_id, source_scenario_ids,
+                             workers=workers, dataset_cache=dataset_cache)
+
+    print_dataset_cache_stats(dataset_cache)
 
 @hydra_app(category='network_utility', name='Combine dataframes from multiple networks at once')
 @cli.command(name='un-hide-nodes', context_settings=dict(
@@ -1,7 +1,13 @@
+import numpy
 import pandas
 from hydra_base.lib.objects import JSONObject, ResourceScenario, Dataset
 from hydra_base.exceptions import HydraError
+import hashlib
 import json
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 
 import logging
 log = logging.getLogger(__name__)
@@ -9,43 +15,281 @@ log = logging.getLogger(__name__)
 def json_to_df(json_dataframe):
     """
      Create a pandas dataframe from a json string.
-     Pandas does not maintain the order of the index; it sorts it.
-     To manage this, we avail of python 3.6+ inhernet dict ordering to identify
-     the correct index order, and then reindex the dataframe to this after
-     it has been created
+     The string is parsed once, and the dataframe is built directly from the
+     resulting dict, so the order of the columns and the index is the
+     order in which they appear in the json (python 3.6+ dicts are ordered).
     """
-    #Load the json dataframe into a native dict
-    data_dict = json.loads(json_dataframe)
+    return dict_to_df(json.loads(json_dataframe))
 
-    #load the json dataframe into a pandas dataframe
-    df = pandas.read_json(json_dataframe)
+def dict_to_df(data_dict):
+    """
+     Create a pandas dataframe from a column-oriented dict of the form
+     {column: {index: value}}, as produced by json.loads on the output
+     of DataFrame.to_json(orient='columns').
+
+     Each column is converted to a numpy array in one step, rather than
+     letting pandas infer and align it value by value. The index and the column
+     names are kept as strings, in their original order. If the columns don't
+     all share the same index, the index is the union of all of them, in the
+     order the entries are first seen, and missing values are NaN.
+
+     An index of timestamps or ISO datetimes is normalised to the strings
+     encode_index produces, as pandas.read_json and astype(str) did, so that
+     '1577836800000' and '2020-01-01T00:00:00.000Z' both become '2020-01-01'.
+    """
+    columns = [str(c) for c in data_dict.keys()]
 
-    #extraxt the ordered index from the dict
-    ordered_index = list(data_dict[str(df.columns[0])].keys())
+    if len(columns) == 0:
+        return pandas.DataFrame()
 
-    #extract the order of columns
-    ordered_cols = list(data_dict.keys())
+    column_data = list(data_dict.values())
 
-    #Make the df index and columns a string so it is comparable to the dict index (which must be string based)
-    df.index = df.index.astype(str)
-    df.columns = df.columns.astype(str)
+    #Use the first column to identify the index order
+    index = list(column_data[0].keys())
 
-    #set the column ordering as per the incoming json data
-    df = df[ordered_cols]
+    #Only build the union of the indices if the columns don't all have the
+    #same keys in the same order. (Comparing the keys() views would ignore the order.)
+    aligned = all(list(col) == index for col in column_data[1:])
+    if not aligned:
+        index = list(dict.fromkeys(k for col in column_data for k in col))
 
-    #reindex the dataframe to be properly ordered but only if it's not a timeseries
-#    if not isinstance(df.index, pandas.DatetimeIndex):
-#        #reindex the dataframe to have the correct order
-#        df = df.reindex(ordered_index)
+    arrays = {}
+    for col_name, col in zip(columns, column_data):
+        if aligned:
+            values = list(col.values())
+        else:
+            values = [col.get(k) for k in index]
+        arrays[col_name] = _values_to_array(values)
+
+    df = pandas.DataFrame(arrays, index=_normalise_date_index(index), columns=columns)
 
     return df
 
+#Timestamps before a year after the epoch are taken to be plain integers, as in pandas.read_json
+_MIN_TIMESTAMP = 31536000
+_TIMESTAMP_UNITS = ('s', 'ms', 'us', 'ns')
+_MIDNIGHT = numpy.array(list('00:00:00'))
+
+def _normalise_date_index(index):
+    """
+        Make an index from a list of keys, converting them all at once to the
+        encode_index strings of their datetimes if they are all timestamps or all
+        ISO datetimes, with any time zone converted to UTC. Other keys are kept as they are.
+    """
+    index = pandas.Index(index, dtype=object)
+    if len(index) == 0:
+        return index
+
+    first_key = index[0]
+    if not isinstance(first_key, str):
+        return index
+
+    is_timestamp = first_key.isdigit()
+    if not is_timestamp and not (first_key[:4].isdigit() and first_key[4:5] == '-'):
+        return index
+
+    #The keys as fixed-width characters, so they can be checked without a python loop.
+    #Keys shorter than the longest are padded with ''.
+    strings = index.values.astype(str)
+    characters = strings.view('U1').reshape(len(strings), -1)
+
+    if is_timestamp:
+        if not numpy.char.isdigit(strings).all():
+            return index
+        try:
+            timestamps = strings.astype(numpy.int64)
+        except OverflowError:
+            return index
+        if not (timestamps > _MIN_TIMESTAMP).all():
+            return index
+        for unit in _TIMESTAMP_UNITS:
+            try:
+                return _encode_datetime_index(pandas.to_datetime(timestamps, unit=unit))
+            except (ValueError, OverflowError):
+                continue
+        return index
+
+    #Datetimes which are already as encode_index formats them are left as they are
+    width = characters.shape[1]
+    if (characters[:, -1] != '').all():
+        if width == 10:
+            return index
+        if width == 19 and (characters[:, 10] == ' ').all() and \
+                not (characters[:, 11:] == _MIDNIGHT).all():
+            return index
+
+    #Keys which aren't all datetimes can't be parsed
+    try:
+        datetimes = pandas.to_datetime(index, utc=True).tz_convert(None)
+    except (ValueError, OverflowError):
+        return index
+
+    return _encode_datetime_index(datetimes)
+
+class _EncodedIndexCache(object):
+    """
+        The string encodings of the most recently encoded indices, keyed by the
+        id of the index. Each entry keeps a reference to its index, so the id
+        can't be reused by another object while the entry is in the cache.
+        Indices are immutable, so the encoding of an index object can't change.
+    """
+    def __init__(self, maxsize=8):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, index):
+        with self._lock:
+            entry = self._cache.get(id(index))
+            if entry is not None and entry[0] is index:
+                self.hits += 1
+                self._cache.move_to_end(id(index))
+                return entry[1]
+            self.misses += 1
+        return None
+
+    def set(self, index, encoded_index):
+        with self._lock:
+            self._cache[id(index)] = (index, encoded_index)
+            self._cache.move_to_end(id(index))
+            if len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._cache)}
+
+_encoded_index_cache = _EncodedIndexCache()
+
+def encode_index(index):
+    """
+     Convert an index to strings, as index.astype(str) does, so that it can be
+     compared to the index of a dataframe decoded from json, and embedded in
+     json as strings of datetimes rather than timestamps.
+
+     A DatetimeIndex is formatted in one vectorised step, rather than one
+     timestamp at a time. An index which is already strings is returned as it
+     is. The result is cached, so the columns of one dataframe, which share
+     its index object, only encode it once.
+    """
+    if index.dtype == object and index.inferred_type == 'string':
+        return index
+
+    encoded_index = _encoded_index_cache.get(index)
+    if encoded_index is None:
+        if isinstance(index, pandas.DatetimeIndex):
+            encoded_index = _encode_datetime_index(index)
+        else:
+            encoded_index = index.astype(str)
+        _encoded_index_cache.set(index, encoded_index)
+
+    return encoded_index
+
+def _encode_datetime_index(index):
+    """
+        Format a DatetimeIndex in the same way as astype(str): as '%Y-%m-%d' if
+        every timestamp is at midnight, otherwise as '%Y-%m-%d %H:%M:%S'.
+        Time zones and fractions of a second are left to astype(str).
+    """
+    valid = ~index.isna()
+    nanoseconds = index.asi8[valid]
+
+    if index.tz is not None or (nanoseconds % 10**9 != 0).any():
+        return index.astype(str)
+
+    if (nanoseconds % (86400 * 10**9) == 0).all():
+        strings = numpy.datetime_as_string(index.values, unit='D')
+    else:
+        strings = numpy.datetime_as_string(index.values, unit='s')
+        #'YYYY-MM-DDTHH:MM:SS' -> 'YYYY-MM-DD HH:MM:SS', leaving 'NaT' alone
+        characters = strings.view('U1').reshape(len(strings), -1)
+        characters[valid, 10] = ' '
+
+    return pandas.Index(strings.astype(object), dtype=object, name=index.name)
+
+def df_to_json(df):
+    """
+     Serialise a dataframe to a column-oriented json string, with the index
+     as strings. This uses pandas' C json encoder, with to_json's default
+     precision of 10 decimal places, so every dataset value is encoded the
+     same way, and an unchanged value keeps the same encoding.
+    """
+    encoded_index = encode_index(df.index)
+    if encoded_index is not df.index:
+        df = df.set_axis(encoded_index, axis=0)
+    return df.to_json(orient='columns')
+
+def pywr_value_to_df(value):
+    """
+     Create a pandas dataframe from the 'data' entry of a pywr dataframe
+     parameter, which can be given as a json string or an already-parsed dict.
+     The value is parsed once and the dataframe is built from the parsed dict,
+     rather than re-encoding the 'data' entry to json and parsing it again.
+    """
+    if isinstance(value, str):
+        value = json.loads(value)
+    return dict_to_df(value["data"])
+
+def df_to_pywr_value(df, value=None):
+    """
+     Serialise a dataframe as a pywr dataframe parameter json string. The other
+     entries of `value` (a dict), such as 'pandas_kwargs', are kept, and 'data'
+     is replaced by the dataframe. If value is None, a new dataframeparameter
+     is created.
+
+     The dataframe is encoded with df_to_json, and spliced into the encoding of
+     the rest of the value, so it is encoded once, by pandas' C encoder, rather
+     than going through to_json, json.loads and json.dumps.
+    """
+    if value is None:
+        value = {
+            "type": "dataframeparameter",
+            "data": None,
+            "pandas_kwargs": {"parse_dates": True}
+        }
+    elif "data" not in value:
+        value = dict(value, data=None)
+
+    items = []
+    for key, entry in value.items():
+        encoded_entry = df_to_json(df) if key == "data" else json.dumps(entry)
+        items.append(f'{json.dumps(key)}: {encoded_entry}')
+
+    return '{' + ', '.join(items) + '}'
+
+def _values_to_array(values):
+    """
+        Convert a list of json values to a numpy array. Numeric columns
+        containing nulls become float columns with NaN, in the same
+        way as pandas.read_json. Anything else is left as an object array.
+    """
+    try:
+        array = numpy.array(values)
+    except ValueError:
+        #ragged lists of values can't be made into a numpy array directly
+        array = None
+
+    if array is not None and array.dtype == object:
+        try:
+            array = numpy.array(values, dtype=float)
+        except (TypeError, ValueError):
+            pass
+    elif array is None or array.ndim != 1 or array.dtype.kind in 'US':
+        #strings, and values which numpy would turn into extra dimensions
+        #(lists, for example) are kept as python objects
+        array = numpy.empty(len(values), dtype=object)
+        for i, v in enumerate(values):
+            array[i] = v
+
+    return array
+
 def make_dataframe_dataset_value(existing_value, df, data_type,
                                  column=None, node_name=None, overwrite=False):
 
     #Turn the target dataframe's index into a string so it is comparable to
     #the index of the dataframe coming from existing_value
-    df.index = df.index.astype(str)
+    df.index = encode_index(df.index)
 
     #if it's not a dataframe, it's probably a series,
     #so turn it into a dataframe
@@ -61,7 +305,7 @@ def make_dataframe_dataset_value(existing_value, df, data_type,
 
         else:
             #Set the value directly (overwriting any existing value)
-            value = df.to_json(orient='columns')
+            value = df_to_json(df)
 
     elif data_type.lower() == 'pywr_dataframe':
 
@@ -72,13 +316,7 @@ def make_dataframe_dataset_value(existing_value, df, data_type,
                                            node_name=node_name)
 
         else:
-            df.index = df.index.astype(str)
-            value = {
-                "type": "dataframeparameter",
-                "data": json.loads(df.to_json(orient='columns')),
-                "pandas_kwargs": {"parse_dates": True}
-            }
-        value = json.dumps(value)
+            value = df_to_pywr_value(df)
     else:
         raise NotImplementedError(f'Datatype "{data_type.upper()}" not supported.')
 
@@ -88,6 +326,7 @@ def _update_pywr_dataframe(existing_value, new_df, column=None, node_name=None):
     """
         Update an existing pywr dataframe. A pywr dataframe is a dict containing
         a 'data' entry, which is a json-representaion of a pandas dataframe.
+        Returns the updated value as a json string.
     """
     value = json.loads(existing_value)
 
@@ -96,7 +335,7 @@ def _update_pywr_dataframe(existing_value, new_df, column=None, node_name=None):
         #can be updated, and needs to be overwritten
         existing_df = None
         try:
-            existing_df = json_to_df(json.dumps(value["data"]))
+            existing_df = pywr_value_to_df(value)
         except Exception as err:
             log.warning(f"Unable to convert {node_name} value to a dataframe.\n"+
                         " This value must already be a dataframe.\n"+
@@ -121,15 +360,11 @@ def _update_pywr_dataframe(existing_value, new_df, column=None, node_name=None):
                                 "Please specify which column to update with"+
                                 " the --column argument")
         # Embed data as strings of datetimes rather than timestamps.
-        existing_df.index = existing_df.index.astype(str)
-        value["data"] = json.loads(existing_df.to_json())
+        return df_to_pywr_value(existing_df, value)
     else:
         # Embed data as strings of datetimes rather than timestamps.
         log.warning("Value on %s has no 'data' entry. Updating the value as a PYWR dataframe.", node_name)
-        new_df.index = new_df.index.astype(str)
-        value["data"] = json.loads(new_df.to_json())
-
-    return value
+        return df_to_pywr_value(new_df, value)
 
 def _update_dataframe(existing_value, new_df, column=None):
     """
@@ -159,13 +394,237 @@ def _update_dataframe(existing_value, new_df, column=None):
         existing_df = new_df
 
     # Embed data as strings of datetimes rather than timestamps.
-    existing_df.index = existing_df.index.astype(str)
-    value = existing_df.to_json(orient='columns')
+    value = df_to_json(existing_df)
 
     return value
 
+RESOURCE_TYPES = ('NODE', 'LINK', 'GROUP', 'NETWORK')
+
+class NetworkData(object):
+    """
+        The resources of one type (nodes, links, groups or the network itself)
+        in a network, and the data of a scenario on those resources for a set
+        of attributes, indexed for lookup in memory.
+
+        resource_type: 'NODE', 'LINK', 'GROUP' or 'NETWORK'
+        resources: The resources, keyed on name
+        resource_attributes: The resource attributes of the resources, keyed on (resource_id, attr_id)
+        resource_scenarios: The resource scenarios of the resources, keyed on (resource_id, attr_id)
+    """
+    def __init__(self, network_id, scenario_id, resources, resource_attributes, resource_scenarios,
+                 resource_type='NODE'):
+        self.network_id = network_id
+        self.scenario_id = scenario_id
+        self.resources = resources
+        self.resource_attributes = resource_attributes
+        self.resource_scenarios = resource_scenarios
+        self.resource_type = resource_type
+
+    def get_attribute_ids(self):
+        """ The IDs of the attributes of the resources, in order. """
+        return sorted(set(attr_id for _, attr_id in self.resource_attributes))
+
+def get_network_resources(client, network_id, resource_type='NODE'):
+    """
+        Fetch all the resources of one type in a network, with their resource
+        attributes but without any data, in one request.
+        returns:
+            list of resources. For 'NETWORK', this is a list of the network itself.
+    """
+    resource_type = resource_type.upper()
+
+    if resource_type == 'NODE':
+        return client.get_nodes(network_id)
+    elif resource_type == 'LINK':
+        return client.get_links(network_id)
+    elif resource_type not in RESOURCE_TYPES:
+        raise ValueError(f'Resource type "{resource_type}" not supported. '
+                         f'It must be one of {", ".join(RESOURCE_TYPES)}.')
+
+    network = client.get_network(network_id, include_data=False)
+    if resource_type == 'GROUP':
+        return network.get('resourcegroups') or []
+    return [network]
+
+def prefetch_resource_data(client, scenario_id, attribute_ids=None, resource_type='NODE', include_data=True):
+    """
+        Fetch the resources of one type in a scenario's network, and the scenario's
+        data on them for the specified attributes, in bulk rather than resource by resource.
+        args:
+            client: (JSONConnection): The hydra client object
+            scenario_id (int): The scenario ID
+            attribute_ids (list(int)): The attribute IDs whose data is needed. If None, all of them.
+            resource_type (str): 'NODE', 'LINK', 'GROUP' or 'NETWORK'
+            include_data (bool): If False, only the resources are fetched, and the data
+                                 can be fetched later, in parts, with fetch_resource_data.
+        returns:
+            NetworkData
+    """
+    network_id = client.get_scenario(scenario_id, include_data=False)['network_id']
+
+    resources = get_network_resources(client, network_id, resource_type)
+
+    network_data = make_network_data(network_id, scenario_id, resources, attribute_ids, resource_type)
+
+    if include_data:
+        fetch_resource_data(client, network_data, attribute_ids)
+
+    return network_data
+
+def make_network_data(network_id, scenario_id, resources, attribute_ids=None, resource_type='NODE'):
+    """
+        Index the resources of a network, and their resource attributes of attribute_ids,
+        in a NetworkData with no data yet.
+    """
+    if attribute_ids is not None:
+        attribute_ids = set(attribute_ids)
+
+    resource_index = {}
+    resource_attributes = {}
+    for resource in resources:
+        resource_index[resource['name']] = resource
+        for resource_attribute in resource.get('attributes') or []:
+            if attribute_ids is not None and resource_attribute['attr_id'] not in attribute_ids:
+                continue
+            key = (resource['id'], resource_attribute['attr_id'])
+            resource_attributes[key] = resource_attribute
+
+    return NetworkData(network_id, scenario_id, resource_index, resource_attributes, {},
+                       resource_type=resource_type.upper())
+
+#hydra only filters the data of get_attributes_for_resource by resource ID in the
+#database for fewer than 999 IDs. With more, it loads the data of every resource.
+RESOURCE_PAGE_SIZE = 500
+
+def fetch_resource_data(client, network_data, attribute_ids=None, resource_names=None,
+                        page_size=RESOURCE_PAGE_SIZE):
+    """
+        Fetch the scenario's data for some of the attributes of network_data, and add it
+        to network_data.resource_scenarios. The data is requested a page of resources at
+        a time, with one request per page, which returns the data of every attribute on
+        the page's resources. Only the data of attribute_ids is kept.
+        args:
+            client: (JSONConnection): The hydra client object
+            network_data (NetworkData): The resources, from prefetch_resource_data
+            attribute_ids (list(int)): The attribute IDs whose data is needed.
+                                       If None, those of all the resource attributes in network_data.
+            resource_names (list(str)): Only fetch the data of these resources. If None, all of them.
+            page_size (int): The number of resources whose data is requested at once
+        returns:
+            int: The number of datasets fetched
+    """
+    if attribute_ids is None:
+        attribute_ids = network_data.get_attribute_ids()
+
+    num_fetched = 0
+    num_resources = 0
+    for resources in iter_resource_pages(network_data, resource_names, page_size):
+        resource_scenarios = fetch_resource_page(client, network_data, resources, attribute_ids)
+        network_data.resource_scenarios.update(resource_scenarios)
+        num_fetched += len(resource_scenarios)
+        num_resources += len(resources)
+
+    log.info("Fetched %s datasets for %s attributes on %s %s resources from scenario %s", num_fetched,
+             len(attribute_ids), num_resources, network_data.resource_type, network_data.scenario_id)
+
+    return num_fetched
+
+def iter_resource_pages(network_data, resource_names=None, page_size=RESOURCE_PAGE_SIZE):
+    """
+        Split the resources of network_data, or those named in resource_names,
+        into lists of at most page_size resources, in order.
+    """
+    if page_size < 1:
+        raise ValueError(f"page_size must be at least 1, not {page_size}")
+
+    if resource_names is None:
+        resources = list(network_data.resources.values())
+    else:
+        resources = [network_data.resources[name] for name in resource_names
+                     if name in network_data.resources]
+
+    for start in range(0, len(resources), page_size):
+        yield resources[start:start + page_size]
+
+def fetch_resource_page(client, network_data, resources, attribute_ids):
+    """
+        Fetch the scenario's data on a page of network_data's resources in one request.
+        The resources are filtered by ID in the database, and the attributes here.
+        returns:
+            dict: The resource scenarios of attribute_ids, keyed on (resource_id, attr_id)
+    """
+    resource_scenarios = client.get_attributes_for_resource(network_data.network_id,
+                                                            network_data.scenario_id,
+                                                            network_data.resource_type,
+                                                            ref_ids=get_page_ref_ids(network_data, resources))
+
+    return match_resource_data(network_data, attribute_ids, resource_scenarios)
+
+def get_page_ref_ids(network_data, resources):
+    """
+        The IDs by which to filter get_attributes_for_resource to a page of resources.
+    """
+    if network_data.resource_type == 'NETWORK':
+        #A scenario only has one network, and hydra can't filter networks by ID
+        return None
+    return [resource['id'] for resource in resources]
+
+def match_resource_data(network_data, attribute_ids, resource_scenarios):
+    """
+        Key the resource scenarios which are on network_data's resource attributes
+        of attribute_ids on (resource_id, attr_id), ignoring the others.
+        returns:
+            dict: The resource scenarios, keyed on (resource_id, attr_id)
+    """
+    attribute_ids = set(attribute_ids)
+
+    ra_keys = {resource_attribute['id']: key
+               for key, resource_attribute in network_data.resource_attributes.items()
+               if key[1] in attribute_ids}
+
+    matched = {}
+    for resource_scenario in resource_scenarios:
+        key = ra_keys.get(resource_scenario['resource_attr_id'])
+        if key is not None:
+            matched[key] = resource_scenario
+
+    return matched
+
+def make_dataframe_columns_value(existing_value, df, data_type, node_name=None):
+    """
+        Set each of the columns of df, by name, on an existing dataframe or
+        pywr dataframe value, adding any columns which it doesn't have. As in
+        _update_dataframe, the existing dataframe is reindexed to the index of
+        df if they are different lengths.
+    """
+    df = df.set_axis(encode_index(df.index), axis=0)
+
+    if data_type.lower() == 'dataframe':
+        existing_df = _set_dataframe_columns(json_to_df(existing_value), df)
+        value = df_to_json(existing_df)
+    elif data_type.lower() == 'pywr_dataframe':
+        value = json.loads(existing_value)
+        if "data" in value:
+            existing_df = _set_dataframe_columns(pywr_value_to_df(value), df)
+        else:
+            log.warning("Value on %s has no 'data' entry. Updating the value as a PYWR dataframe.", node_name)
+            existing_df = df
+        value = df_to_pywr_value(existing_df, value)
+    else:
+        raise NotImplementedError(f'Datatype "{data_type.upper()}" not supported.')
+
+    return value
+
+def _set_dataframe_columns(existing_df, new_df):
+    if len(new_df.index) != len(existing_df.index):
+        existing_df = existing_df.reindex(new_df.index)
+    for column in new_df.columns:
+        existing_df[str(column)] = new_df[column]
+    return existing_df
+
 def import_dataframe(client, dataframe, network_id, scenario_id, attribute_id, column=None,
-                     create_new=False, data_type='DATAFRAME', overwrite=False):
+                     create_new=False, data_type='DATAFRAME', overwrite=False, chunk_size=100,
+                     skip_unchanged=False, network_data=None, resource_type='NODE'):
     """
     args:
         client: (JSONConnection): The hydra client object
@@ -179,75 +638,126 @@ def import_dataframe(client, dataframe, network_id, scenario_id, attribute_id, c
         overwrite (bool): If true, it overwrites an existing valuye with the new one. If false
                           it will try to update the existing value. The data type of the existing
                           value must match that of the updating value
+        chunk_size (int): The number of datasets to write to hydra in each request
+        skip_unchanged (bool): If true, datasets whose value would not change are not written
+        network_data (NetworkData): The network's resources and data, from prefetch_resource_data.
+                                    If None, they are fetched for this import.
+        resource_type (str): The type of resource named by the columns of the dataframe:
+                             'NODE', 'LINK', 'GROUP' or 'NETWORK'. Ignored if network_data is passed in.
+    returns:
+        dict: The names of the nodes whose data was 'written', of those which 'failed'
+              and of those which were 'skipped' because they were unchanged
     """
-    # Find all the nodes in the network
+    # Find all the resources in the network, and their data for this attribute
+    if network_data is None:
+        network_data = prefetch_resource_data(client, scenario_id, [attribute_id], resource_type)
 
-    scenario = client.get_scenario(scenario_id, include_data=False)
-    network_id = scenario.network_id
+    attribute = client.get_attribute_by_id(attribute_id)
 
+    node_data, skipped = build_node_data(client, dataframe, network_data, attribute, column=column,
+                                         create_new=create_new, data_type=data_type,
+                                         overwrite=overwrite, skip_unchanged=skip_unchanged)
 
-    attribute = client.get_attribute_by_id(attribute_id)
+    # Now update the database with the new data
+    written, failed = write_node_data(client, scenario_id, node_data, chunk_size=chunk_size)
 
-    node_data = {}
+    if skip_unchanged:
+        log.info("%s datasets written, %s unchanged datasets skipped", len(written), len(skipped))
 
-    for node_name in dataframe:
-        # An exception is raised by hydra if the node name does not exist.
-        try:
-            node = client.get_node_by_name(network_id, node_name)
-        except Exception as e:
-            log.exception(e)
-            log.warning(e)
-            continue
+    return {'written': written, 'failed': failed, 'skipped': skipped}
 
-        # Fetch the node's data
-        resource_scenarios = client.get_resource_data('NODE', node['id'], scenario_id)
-        for resource_scenario in resource_scenarios:
-            resource_attribute_id = resource_scenario['resource_attr_id']
-            resource_attribute = client.get_resource_attribute(resource_attribute_id)
+def get_resource_names(dataframe):
+    """
+        The names of the resources in the columns of a dataframe to import. With
+        (node, column) columns, each node has a dataframe of the columns to set.
+    """
+    if dataframe.columns.nlevels > 1:
+        return list(dataframe.columns.get_level_values(0).unique())
+    return list(dataframe.columns)
 
-            if resource_attribute['attr_id'] != attribute_id:
-                continue  # Skip the wrong attribute data
+def build_node_data(client, dataframe, network_data, attribute, column=None, create_new=False,
+                     data_type='DATAFRAME', overwrite=False, skip_unchanged=False):
+    """
+        Compute the new dataset for each node column of a dataframe, for one attribute,
+        from the prefetched network data. The arguments are as for import_dataframe.
+        The columns name resources of network_data's resource type, which are nodes by default.
+        returns:
+            (dict, list): The data to write, keyed on node name, and the names of the
+                          nodes which were skipped because they are unchanged
+    """
+    attribute_id = attribute['id']
+    resource_type = network_data.resource_type
+    resource_label = resource_type.capitalize()
 
+    node_data = {}
+    skipped = []
+
+    for node_name in get_resource_names(dataframe):
+        node = network_data.resources.get(node_name)
+        if node is None:
+            log.warning("%s %s not found in network %s", resource_label, node_name, network_data.network_id)
+            continue
+
+        #The prefetched dataset is updated in place, so it's no longer needed in network_data
+        resource_scenario = network_data.resource_scenarios.pop((node['id'], attribute_id), None)
+        if resource_scenario is not None:
             dataset = resource_scenario['dataset']
 
             if dataset['type'].lower() != data_type.lower() and overwrite == False:
-                raise ValueError(f'Node "{node_name}" datatset for attribute_id'
+                raise ValueError(f'{resource_label} "{node_name}" datatset for attribute_id'
                                  f' {attribute_id}" must be'
                                  f' type "{dataset["type"]}", not type "{data_type.upper()}".')
 
-            dataset['value'] = make_dataframe_dataset_value(dataset['value'],
-                                                            dataframe[node_name],
-                                                            data_type,
-                                                            column,
-                                                            node_name,
-                                                            overwrite=overwrite)
+            node_df = dataframe[node_name]
+            if isinstance(node_df, pandas.DataFrame) and overwrite is False:
+                value = make_dataframe_columns_value(dataset['value'], node_df, data_type, node_name)
+            else:
+                value = make_dataframe_dataset_value(dataset['value'],
+                                                     node_df,
+                                                     data_type,
+                                                     column,
+                                                     node_name,
+                                                     overwrite=overwrite)
             #update the data type if necessary
-            dataset['type'] = dataset['type'] if overwrite is False else data_type
+            new_type = dataset['type'] if overwrite is False else data_type
+
+            if skip_unchanged and new_type.lower() == dataset['type'].lower() \
+                    and dataset_value_hash(value) == dataset_value_hash(dataset['value']):
+                skipped.append(node_name)
+                continue
+
+            dataset['value'] = value
+            dataset['type'] = new_type
 
             node_data[node_name] = {
-                'node_id': node['id'],
-                'resource_attribute_id': resource_attribute['id'],
+                'resource_id': node['id'],
+                'resource_attribute_id': resource_scenario['resource_attr_id'],
                 'dataset': dataset,
             }
 
         if node_name not in node_data:
             if not create_new:
                 # No resource attribute found!
-                raise ValueError(f'Node "{node_name}" does not contain a resource attribute '
+                raise ValueError(f'{resource_label} "{node_name}" does not contain a resource attribute '
                                  f'for the attribute "{attribute["name"]}".')
             else:
-                resource_attribute = client.add_resource_attribute('NODE',
-                                                                   node['id'],
-                                                                   attribute_id, 'N',
-                                                                   error_on_duplicate=False)
-
-                df = dataframe[node_name].to_frame()
-                df.columns = [column]
+                resource_attribute = network_data.resource_attributes.get((node['id'], attribute_id))
+                if resource_attribute is None:
+                    resource_attribute = client.add_resource_attribute(resource_type,
+                                                                       node['id'],
+                                                                       attribute_id, 'N',
+                                                                       error_on_duplicate=False)
+
+                df = dataframe[node_name]
+                if isinstance(df, pandas.DataFrame):
+                    df = df.copy()
+                else:
+                    df = df.to_frame()
+                    df.columns = [column]
 
                 if data_type.lower() == 'dataframe':
                     # Embed data as strings of datetimes rather than timestamps.
-                    df.index = df.index.astype(str)
-                    value = df.to_json(orient='columns')
+                    value = df_to_json(df)
                 else:
                     default_value = json.dumps({
                         "type": "dataframeparameter",
@@ -270,47 +780,427 @@ def import_dataframe(client, dataframe, network_id, scenario_id, attribute_id, c
                 })
 
                 node_data[node_name] = {
-                    'node_id': node['id'],
+                    'resource_id': node['id'],
                     'resource_attribute_id': resource_attribute['id'],
                     'dataset': dataset,
                 }
 
-    # Now update the database with the new data
-    for node_name, data in node_data.items():
+
+    return node_data, skipped
+
+def import_dataframe_groups(client, dataframes, network_id, scenario_id, attribute_id, **kwargs):
+    """
+        Import a sequence of dataframes, each containing a different group of nodes,
+        as import_dataframe does, fetching the network's nodes only once. The existing
+        data is fetched a group at a time, for the nodes in the group, so if `dataframes`
+        is a generator only one group's data needs to be in memory at a time.
+        args:
+            dataframes (iterable of pandas dataframes)
+            The other arguments are the same as import_dataframe
+        returns:
+            dict: The names of the nodes which were 'written', 'failed' or 'skipped', over all the dataframes
+    """
+    network_data = prefetch_resource_data(client, scenario_id, [attribute_id],
+                                          kwargs.pop('resource_type', 'NODE'), include_data=False)
+
+    result = {'written': [], 'failed': [], 'skipped': []}
+    for dataframe in dataframes:
+        fetch_resource_data(client, network_data, [attribute_id],
+                            resource_names=get_resource_names(dataframe))
+
+        group_result = import_dataframe(client, dataframe, network_id, scenario_id, attribute_id,
+                                        network_data=network_data, **kwargs)
+        for key, node_names in group_result.items():
+            result[key].extend(node_names)
+
+        #Release any of the group's data which wasn't used
+        network_data.resource_scenarios.clear()
+
+    return result
+
+def import_dataframes(client, dataframes, scenario_id, column=None, create_new=False,
+                      data_type='DATAFRAME', overwrite=False, chunk_size=100, skip_unchanged=False,
+                      resource_type='NODE'):
+    """
+        Import several dataframes, each into its own attribute, as import_dataframe
+        does, with one prefetch of the network's nodes and data and one batched write.
+        args:
+            dataframes (dict): The dataframes to import, keyed on attribute ID. The columns
+                               of each dataframe are node names.
+            The other arguments are the same as import_dataframe
+        returns:
+            dict: The '<node name> (<attribute name>)' labels of the datasets which
+                  were 'written', 'failed' or 'skipped'
+    """
+    attributes = {attribute_id: client.get_attribute_by_id(attribute_id) for attribute_id in dataframes}
+
+    network_data = prefetch_resource_data(client, scenario_id, list(dataframes), resource_type)
+
+    node_data = {}
+    skipped = []
+    for attribute_id, dataframe in dataframes.items():
+        attribute = attributes[attribute_id]
+        attribute_node_data, attribute_skipped = build_node_data(client, dataframe, network_data, attribute,
+                                                                 column=column, create_new=create_new,
+                                                                 data_type=data_type, overwrite=overwrite,
+                                                                 skip_unchanged=skip_unchanged)
+        for node_name, data in attribute_node_data.items():
+            node_data[f"{node_name} ({attribute['name']})"] = data
+        skipped.extend(f"{node_name} ({attribute['name']})" for node_name in attribute_skipped)
+
+    written, failed = write_node_data(client, scenario_id, node_data, chunk_size=chunk_size)
+
+    log.info("%s datasets written for %s attributes, %s unchanged datasets skipped",
+             len(written), len(dataframes), len(skipped))
+
+    return {'written': written, 'failed': failed, 'skipped': skipped}
+
+def import_multiindex_dataframe(client, dataframe, scenario_id, **kwargs):
+    """
+        Import a dataframe with (node, attribute) columns, or (node, attribute, column)
+        columns to set specific columns of each node's dataframe, into many attributes
+        at once, with one prefetch of the network's nodes and data and one batched write.
+        args:
+            dataframe (pandas dataframe): A dataframe with two or three levels of columns.
+                                          Attributes are given by name or ID.
+            The other arguments are the same as import_dataframes
+        returns:
+            dict: The '<node name> (<attribute name>)' labels of the datasets which
+                  were 'written', 'failed' or 'skipped'
+    """
+    if dataframe.columns.nlevels not in (2, 3):
+        raise ValueError("The dataframe must have (node, attribute) or (node, attribute, column) columns.")
+
+    attributes = list(dataframe.columns.get_level_values(1).unique())
+    network_id = client.get_scenario(scenario_id, include_data=False)['network_id']
+    attribute_ids = get_attribute_ids(client, attributes, network_id=network_id)
+
+    dataframes = {}
+    for attribute in attributes:
+        attribute_id = attribute_ids[attribute]
+        if attribute_id in dataframes:
+            raise ValueError(f'Attribute {attribute_id} appears under more than one name')
+        #remove the attribute level, leaving (node) or (node, column) columns
+        dataframes[attribute_id] = dataframe.xs(attribute, axis=1, level=1, drop_level=True)
+
+    return import_dataframes(client, dataframes, scenario_id, **kwargs)
+
+def get_attribute_ids(client, attributes, network_id=None):
+    """
+        Find the IDs of a list of attributes, each given by its ID or its name.
+        args:
+            attributes (list): attribute IDs (as int or str) or attribute names
+            network_id (int): Look names up among the attributes which can be used in this
+                              network: those scoped to it or its projects, and global ones.
+                              If None, only global attributes are searched.
+        returns:
+            dict: The ID of each of the attributes, keyed on the attribute as given
+    """
+    attribute_ids = {}
+    names = []
+    for attribute in attributes:
         try:
-            client.add_data_to_attribute(scenario_id, data['resource_attribute_id'], data['dataset'])
-        except:
-            print("ERROR ADDING DATA")
+            attribute_ids[attribute] = int(attribute)
+        except ValueError:
+            names.append(attribute)
 
+    if len(names) > 0:
+        if network_id is None:
+            network_attributes = client.get_attributes()
+        else:
+            network_attributes = client.get_attributes(network_id=network_id, include_global=True,
+                                                       include_hierarchy=True)
+
+        ids_by_name = {}
+        for attr in network_attributes:
+            ids = ids_by_name.setdefault(attr['name'], [])
+            if attr['id'] not in ids:
+                ids.append(attr['id'])
+
+        for name in names:
+            ids = ids_by_name.get(name, [])
+            if len(ids) == 0:
+                raise ValueError(f'Attribute "{name}" not found.')
+            elif len(ids) > 1:
+                raise ValueError(f'There are {len(ids)} attributes called "{name}". '
+                                 f'Use one of their IDs instead: {ids}')
+            attribute_ids[name] = ids[0]
+
+    return attribute_ids
+
+def dataset_value_hash(value):
+    """
+        Hash a dataset value so that equivalent json values have the same hash,
+        whatever their whitespace or integer / float formatting. The order of the
+        keys is kept, as it is the order of the dataframe. Values which
+        aren't json are hashed as they are.
+    """
+    try:
+        canonical = json.dumps(json.loads(value, parse_int=float),
+                               separators=(',', ':'), ensure_ascii=False)
+    except (TypeError, ValueError):
+        canonical = str(value)
 
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
 
-def export_dataframes(client, network_id, scenario_id, attribute_ids=None):
+def write_node_data(client, scenario_id, node_data, chunk_size=100):
+    """
+        Save the datasets collected by import_dataframe to a scenario, using
+        one update_resourcedata call per chunk of nodes. If a chunk fails,
+        its datasets are sent one at a time to identify which nodes failed.
+        args:
+            client: (JSONConnection): The hydra client object
+            scenario_id (int): The scenario ID
+            node_data (dict): The data to write, keyed on node name, as built by import_dataframe
+            chunk_size (int): The number of datasets to send in each request
+        returns:
+            (list, list): The names of the nodes which were written and of those which failed
+    """
+    chunks = make_chunks(node_data, chunk_size)
 
-    nodes = client.get_nodes(network_id)
+    return merge_chunk_results(_write_chunk(client, scenario_id, chunk, chunk_num, len(chunks))
+                                for chunk_num, chunk in enumerate(chunks, 1))
 
-    node_dataframes = {}
+def make_chunks(node_data, chunk_size):
+    """
+        Split the (node name, data) items of node_data into lists of chunk_size items.
+    """
+    if chunk_size < 1:
+        raise ValueError(f"chunk_size must be at least 1, not {chunk_size}")
 
-    for node in nodes:
-        dataframes = {}  # Dataframes from this node
-        # Fetch the node's data
-        resource_scenarios = client.get_resource_data('NODE', node['id'], scenario_id)
-        for resource_scenario in resource_scenarios:
-            resource_attribute_id = resource_scenario['resource_attr_id']
-            resource_attribute = client.get_resource_attribute(resource_attribute_id)
+    items = list(node_data.items())
+    return [items[start:start + chunk_size] for start in range(0, len(items), chunk_size)]
 
-            if attribute_ids is not None and resource_attribute['attr_id'] not in attribute_ids:
-                continue  # Skip the wrong attribute data
+def merge_chunk_results(chunk_results):
+    """
+        Combine the (written, failed) results of writing each chunk,
+        and log the nodes which failed.
+        returns:
+            (list, list): The names of the nodes which were written and of those which failed
+    """
+    written = []
+    failed = []
+    for chunk_written, chunk_failed in chunk_results:
+        written.extend(chunk_written)
+        failed.extend(chunk_failed)
 
-            attribute = client.get_attribute_by_id(resource_attribute['attr_id'])
-            attribute_name = attribute['name']
+    if len(failed) > 0:
+        log.error("Data for %s nodes could not be written: %s", len(failed), ", ".join(failed))
 
-            dataset = resource_scenario['dataset']
+    return written, failed
+
+def _write_chunk(client, scenario_id, chunk, chunk_num, num_chunks):
+    """
+        Write a chunk of (node name, data) items in one request, falling back
+        to one request per dataset if it fails.
+        returns:
+            (list, list): The names of the nodes which were written and of those which failed
+    """
+    resource_scenarios = [make_resource_scenario(scenario_id, data) for _, data in chunk]
 
-            if dataset['type'].lower() != 'dataframe':
-                continue  # Skip non-datasets
+    try:
+        client.update_resourcedata(scenario_id, resource_scenarios)
+    except Exception as err:
+        log.warning("Chunk %s/%s failed (%s). Retrying each dataset individually.",
+                    chunk_num, num_chunks, err)
+    else:
+        log.info("Chunk %s/%s: wrote %s datasets", chunk_num, num_chunks, len(chunk))
+        return [node_name for node_name, _ in chunk], []
+
+    written = []
+    failed = []
+    for (node_name, _), resource_scenario in zip(chunk, resource_scenarios):
+        try:
+            client.update_resourcedata(scenario_id, [resource_scenario])
+            written.append(node_name)
+        except Exception as err:
+            log.error("Unable to write data for node %s: %s", node_name, err)
+            failed.append(node_name)
 
-            df = json_to_df(dataset['value'])
-            yield node['name'], attribute_name, df
+    return written, failed
+
+def make_resource_scenario(scenario_id, data):
+    """ The resource scenario with which to write one node's data, as built by build_node_data. """
+    return JSONObject({
+        'resource_attr_id': data['resource_attribute_id'],
+        'scenario_id': scenario_id,
+        'dataset': data['dataset'],
+    })
+
+
+
+class LookupCache(object):
+    """
+        A bounded, least-recently-used memo of a single-argument lookup function,
+        such as client.get_attribute_by_id, which counts its hits and misses.
+    """
+    def __init__(self, func, maxsize=1024):
+        self.func = func
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __call__(self, key):
+        with self._lock:
+            if key in self._cache:
+                self.hits += 1
+                self._cache.move_to_end(key)
+                return self._cache[key]
+            self.misses += 1
+
+        value = self.func(key)
+
+        with self._lock:
+            self._cache[key] = value
+            if len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+
+        return value
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._cache)}
+
+class AttributeLookup(object):
+    """
+        Memoized attribute lookups, to be shared by everything in a
+        single export so each ID is only requested once.
+    """
+    def __init__(self, client, maxsize=1024):
+        self.attributes = LookupCache(client.get_attribute_by_id, maxsize=maxsize)
+
+    def get_attribute(self, attr_id):
+        return self.attributes(attr_id)
+
+    def stats(self):
+        return {
+            'attributes': self.attributes.stats(),
+        }
+
+def ordered_map(func, items, workers=None):
+    """
+        Apply func to each item, yielding the results in the order of the items.
+        If workers is more than 1, func is run on a pool of that many threads.
+        Only a few items per worker are submitted ahead of the one being
+        yielded, so the number of results held in memory stays bounded.
+        An exception raised by func is raised when its result is reached.
+    """
+    if workers is None or workers <= 1:
+        for item in items:
+            yield func(item)
+        return
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for item in items:
+            pending.append(executor.submit(func, item))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def export_dataframes(client, network_id, scenario_id, attribute_ids=None, lookup=None,
+                      dataset_cache=None, resource_type='NODE', page_size=RESOURCE_PAGE_SIZE, workers=None):
+    """
+        Find the dataframes on the resources of a network in a scenario.
+        The resources are fetched in bulk by prefetch_resource_data, and the scenario's
+        data on them is fetched a page of resources at a time, rather than with a request per
+        resource, so only one page's data is held in memory at once.
+        args:
+            client: (JSONConnection): The hydra client object
+            network_id (int): The network ID, which must be the network of the scenario
+            scenario_id (int): The scenario ID
+            attribute_ids (list(int)): Only export the data of these attributes. If None, export all of them.
+            lookup (AttributeLookup): The attribute lookup cache to use. If None, one is created for this export.
+            dataset_cache (cache.DatasetCache): A cache of decoded dataframes. On a hit, the dataset
+                                                isn't decoded from json.
+            resource_type (str): The type of resource to export: 'NODE', 'LINK', 'GROUP' or 'NETWORK'
+            page_size (int): The number of resources whose data is fetched in each request
+            workers (int): The number of threads with which to fetch pages of data, so the next
+                           pages are fetched while the dataframes of the current one are decoded.
+                           At most two pages per worker are held in memory. If None, the pages
+                           are fetched one at a time. The client must be safe to share between
+                           threads to use this.
+        yields:
+            (resource name, attribute name, dataframe), in the order of the network's resources,
+            with or without workers
+    """
+    if lookup is None:
+        lookup = AttributeLookup(client)
+
+    network_data = prefetch_resource_data(client, scenario_id, attribute_ids, resource_type, include_data=False)
+    if network_id is not None and network_data.network_id != network_id:
+        raise ValueError(f"Scenario {scenario_id} is not in network {network_id}.")
+
+    if attribute_ids is None:
+        attribute_ids = network_data.get_attribute_ids()
+
+    def fetch(resources):
+        resource_scenarios = fetch_resource_page(client, network_data, resources, attribute_ids)
+        return resources, group_resource_scenarios(resource_scenarios)
+
+    pages = iter_resource_pages(network_data, page_size=page_size)
+    for resources, resource_scenarios in ordered_map(fetch, pages, workers=workers):
+        for resource in resources:
+            resource_dataframes = decode_resource_dataframes(resource, resource_scenarios.get(resource['id'], []),
+                                                             lookup, dataset_cache)
+            for resource_name, attribute_name, df in resource_dataframes:
+                yield resource_name, attribute_name, df
+
+    log.info("Attribute lookups: %s", lookup.stats())
+    if dataset_cache is not None:
+        log.info("Dataset cache: %s", dataset_cache.stats())
+
+def group_resource_scenarios(resource_scenarios):
+    """
+        Group resource scenarios, keyed on (resource_id, attr_id), by resource.
+        returns:
+            dict: resource ID -> list of (attribute ID, resource scenario)
+    """
+    grouped = {}
+    for (resource_id, attr_id), resource_scenario in resource_scenarios.items():
+        grouped.setdefault(resource_id, []).append((attr_id, resource_scenario))
+    return grouped
+
+def decode_resource_dataframes(resource, resource_scenarios, lookup, dataset_cache=None):
+    """
+        Decode the dataframes in a resource's resource scenarios, which are
+        (attribute ID, resource scenario) pairs.
+        returns:
+            list of (resource name, attribute name, dataframe)
+    """
+    resource_dataframes = []
+
+    for attr_id, resource_scenario in resource_scenarios:
+        dataset = resource_scenario['dataset']
+
+        if dataset['type'].lower() != 'dataframe':
+            continue  # Skip non-datasets
+
+        attribute_name = lookup.get_attribute(attr_id)['name']
+
+        df = dataset_to_df(dataset, dataset_cache)
+        resource_dataframes.append((resource['name'], attribute_name, df))
+
+    return resource_dataframes
+
+
+def dataset_to_df(dataset, dataset_cache=None):
+    """
+        Decode the dataframe in a dataset, using the decoded dataframe in
+        dataset_cache (a cache.DatasetCache) if there is one, and adding it
+        to the cache if not.
+    """
+    if dataset_cache is None:
+        return json_to_df(dataset['value'])
+
+    df = dataset_cache.get(dataset)
+    if df is None:
+        df = json_to_df(dataset['value'])
+        dataset_cache.put(dataset, df)
+
+    return df
 
 
 def get_resource_scenario(client, resource_attr_id, scenario_id):
@@ -323,7 +1213,54 @@ def get_resource_scenario(client, resource_attr_id, scenario_id):
 
     return ResourceScenario(rs_i)
 
-def get_matching_resource_scenarios(client, resource_attr_id, scenario_id, scenario_ids):
+class ResolutionCache(object):
+    """
+        The lookups made by get_matching_resource_scenarios, memoized for a single
+        run so they are made once per run rather than once per resource attribute:
+            scenario ID -> network ID
+            network ID -> the network's nodes (with their resource attributes),
+                          indexed by name and by resource attribute ID
+        The resource scenarios themselves aren't cached, as each one is only
+        requested once per run, and their datasets can be large.
+    """
+    def __init__(self, client, maxsize=1024):
+        self.client = client
+        self.scenario_networks = LookupCache(self._get_scenario_network, maxsize=maxsize)
+        self.network_nodes = LookupCache(self._get_network_nodes, maxsize=maxsize)
+
+    def _get_scenario_network(self, scenario_id):
+        return self.client.get_scenario(scenario_id, include_data=False).network_id
+
+    def _get_network_nodes(self, network_id):
+        nodes = self.client.get_nodes(network_id)
+
+        by_name = {}
+        by_resource_attr_id = {}
+        for node in nodes:
+            by_name[node.name] = node
+            for ra in node.attributes or []:
+                by_resource_attr_id[ra.id] = (node, ra)
+
+        return {'by_name': by_name, 'by_resource_attr_id': by_resource_attr_id}
+
+    def get_node_by_name(self, network_id, node_name):
+        return self.network_nodes(network_id)['by_name'].get(node_name)
+
+    def get_resource_attribute(self, network_id, resource_attr_id):
+        """
+            Find a node resource attribute, and its node, in a network.
+            returns:
+                (node, resource attribute), or (None, None) if it isn't on a node of the network
+        """
+        return self.network_nodes(network_id)['by_resource_attr_id'].get(resource_attr_id, (None, None))
+
+    def stats(self):
+        return {
+            'scenario_networks': self.scenario_networks.stats(),
+            'network_nodes': self.network_nodes.stats(),
+        }
+
+def get_matching_resource_scenarios(client, resource_attr_id, scenario_id, scenario_ids, cache=None):
     """
         Find the equivalent RS objects from a list of scenarios:
         These scenarios can exist in other networks. These networks should have a resource (node / link) that
@@ -332,34 +1269,62 @@ def get_matching_resource_scenarios(client, resource_attr_id, scenario_id, scena
         The *source* is the network being searched from
 
         The *targets* are the other networks where the matching resource scenarios are being searched
+
+        cache is a ResolutionCache to share between calls. If None, one is created for this call.
     """
+    source_attr_id, targets = get_matching_resource_attributes(client, resource_attr_id, scenario_id,
+                                                               scenario_ids, cache=cache)
 
-    source_rs = get_resource_scenario(client, resource_attr_id, scenario_id)
+    #Now that we have the RA IDS and scenario IDS, find the RSs from each scenario
+    target_rs = []
+    for target_ra_id, target_scenario_id, target_network_id in targets:
+        try:
+            target_rs_i = client.get_resource_scenario(target_ra_id, target_scenario_id)
+        except HydraError:
+            raise Exception(f"Scenario {target_scenario_id} in network"+
+                            f" {target_network_id} does not have data for"+
+                            f" attribute {source_attr_id}")
+
+        target_rs_j = JSONObject(target_rs_i)
+
+        target_rs.append(target_rs_j)
+
+    return target_rs
+
+def get_matching_resource_attributes(client, resource_attr_id, scenario_id, scenario_ids, cache=None):
+    """
+        Find the resource attributes in a list of scenarios which are equivalent to
+        resource_attr_id, as get_matching_resource_scenarios does, without fetching their data.
+
+        Returns the source attribute ID, and a (resource attribute ID, scenario ID, network ID)
+        tuple for each of scenario_ids, in the same order.
+    """
+    if cache is None:
+        cache = ResolutionCache(client)
 
     #Identify the node name, type and attribute ID to use as search criteria in the other scenarios
-    source_ra = client.get_resource_attribute(resource_attr_id)
+    source_network_id = cache.scenario_networks(scenario_id)
+    source_node, source_ra = cache.get_resource_attribute(source_network_id, resource_attr_id)
+    if source_ra is None:
+        source_ra = client.get_resource_attribute(resource_attr_id)
+        source_node = client.get_node(source_ra.node_id)
 
     source_attr_id = source_ra.attr_id
-    source_node_id = source_ra.node_id
-
-    source_node = client.get_node(source_node_id)
 
     #Identify the network IDS from the target scenario IDS
     target_network_ids = []
     for s_id in scenario_ids:
-        scenario_network = client.get_scenario(s_id, include_data=False)
-        target_network_ids.append(scenario_network.network_id)
+        target_network_ids.append(cache.scenario_networks(s_id))
 
     #Using the network IDS and node name, find the equivalent node in each of the
     #target networks.
     target_nodes = []
     for  network_id in target_network_ids:
-        try:
-            target_node = client.get_node_by_name(network_id, source_node.name)
-            target_nodes.append(target_node)
-        except HydraError:
+        target_node = cache.get_node_by_name(network_id, source_node.name)
+        if target_node is None:
             raise Exception(f"Network {network_id} doesn't have a node with the"+
                             f" name {source_node.name}")
+        target_nodes.append(target_node)
 
     #Now find the resource attr ID for each of the target nodes.
     target_ra_ids = []
@@ -372,30 +1337,14 @@ def get_matching_resource_scenarios(client, resource_attr_id, scenario_id, scena
             raise Exception(f"Unable to find attribute {source_attr_id} on "+
                             f"node { target_node.name}")
 
-    #Now that we have the RA IDS and scenario IDS, find the RSs from each scenario
-    target_rs = []
-    for i, target_ra_id in enumerate(target_ra_ids):
-        #these have been kept in the same order, so find the scenario id from the index
-        target_scenario_id = scenario_ids[i]
-        target_network_id = target_network_ids[i]
-
-        try:
-            target_rs_i = client.get_resource_scenario(target_ra_id, target_scenario_id)
-        except HydraError:
-            raise Exception(f"Scenario {target_scenario_id} in network"+
-                            f" {target_network_id} does not have data for"+
-                            f" attribute {source_attr_id}")
-
-        target_rs_j = JSONObject(target_rs_i)
-
-        target_rs.append(target_rs_j)
+    #these have been kept in the same order as the scenario ids
+    return source_attr_id, list(zip(target_ra_ids, scenario_ids, target_network_ids))
 
-    return target_rs
-
-def extract_dataframes(rs_list):
+def extract_dataframes(rs_list, dataset_cache=None):
     """
         Given a list of resource scenarios, extract the dataframe value
-        from the dataset within the RS.
+        from the dataset within the RS. If dataset_cache is passed in, the
+        dataframes are read from it, rather than decoded, where possible.
     """
 
     dataframes = []
@@ -404,37 +1353,59 @@ def extract_dataframes(rs_list):
         if dataset.type.lower() != 'dataframe':
             raise Exception("Value in scenario {} isn't a dataframe".format(rs.scenario_id))
         try:
-            log.info(dataset.value)
-            pandas_df = json_to_df(dataset.value)
+            pandas_df = dataset_to_df(dataset, dataset_cache)
         except:
             raise Exception("Unable to read dataframe from scenario {0}".format(rs.scenario_id))
 
         #before saving the dataframe, add the scenario ID to the column names so they can be unique
-        original_cols = pandas_df.columns
-        new_cols = []
-        for c in original_cols:
-            new_cols.append("{}_{}".format(c, rs.scenario_id))
-
-        pandas_df.columns = new_cols
+        pandas_df.columns = [f"{c}_{rs.scenario_id}" for c in pandas_df.columns]
 
         dataframes.append(pandas_df)
 
     return dataframes
 
-def combine_dataframes(dataframes):
+def combine_dataframes(dataframes, timings=None):
     """
         Take a list of pandas dataframes with the same index and combine
         them into a single multi-column dataframe.
+
+        If the dataframes do all have the same index, their values are stacked
+        directly, with no alignment. Otherwise they are aligned with an
+        outer join on their indices.
+
+        timings: If a dict is passed in, the time spent combining and
+                 encoding the dataframes is added to its 'combine' and 'encode' entries.
     """
-    #merge the datframes, assuming they have the same inndex (axis=1 does that)
-    concat_df = pandas.concat(dataframes, axis=1)
+    start = time.perf_counter()
+
+    index = dataframes[0].index
+    if all(df.index.equals(index) for df in dataframes[1:]):
+        columns = [c for df in dataframes for c in df.columns]
+        dtypes = set(dtype for df in dataframes for dtype in df.dtypes)
+        if len(dtypes) == 1:
+            #a single dtype can be stacked into a single block of values
+            values = numpy.hstack([df.to_numpy() for df in dataframes])
+            concat_df = pandas.DataFrame(values, index=index, columns=columns)
+        else:
+            arrays = [df[c].to_numpy() for df in dataframes for c in df.columns]
+            concat_df = pandas.DataFrame(dict(enumerate(arrays)), index=index)
+            concat_df.columns = columns
+    else:
+        #merge the datframes on their indices (axis=1 does that)
+        concat_df = pandas.concat(dataframes, axis=1)
+
+    combined = time.perf_counter()
 
     dataset = Dataset({
         'name'  : 'Combined Dataframe',
         'type'  : 'dataframe',
-        'value' : concat_df.to_json()
+        'value' : df_to_json(concat_df)
     })
 
+    if timings is not None:
+        timings['combine'] = timings.get('combine', 0) + combined - start
+        timings['encode'] = timings.get('encode', 0) + time.perf_counter() - combined
+
     return dataset
 
 def update_resource_scenario(client, resource_attribute_id, scenario_id, combined_dataframe):
@@ -450,36 +1421,114 @@ def update_resource_scenario(client, resource_attribute_id, scenario_id, combine
 
     client.update_resourcedata(scenario_id, [rs])
 
-def assemble_dataframes(client, resource_attribute_ids, scenario_id, source_scenario_ids):
+class AssembleError(Exception):
+    """
+        Raised by assemble_dataframes, once every resource attribute has been
+        processed, if any of them could not be assembled.
+        errors: The exception raised for each failed resource attribute ID
+        assembled_dataframes: The datasets which were assembled and saved, in input order
+    """
+    def __init__(self, errors, assembled_dataframes):
+        self.errors = errors
+        self.assembled_dataframes = assembled_dataframes
+        message = "Unable to assemble dataframes for resource attributes " + \
+            ", ".join(f"{ra_id} ({err})" for ra_id, err in errors.items())
+        super(AssembleError, self).__init__(message)
+
+def assemble_dataframes(client, resource_attribute_ids, scenario_id, source_scenario_ids, workers=None,
+                        dataset_cache=None):
     """
         Create a single data frame into a resource attribute by finding
         equivalent resource attributes on other specified networks (identified through
         scenario IDS)
+
+        If workers is set, the resource attributes are processed on a pool of that many
+        threads. A failure on one resource attribute doesn't stop the others; the
+        errors are collected and raised together in an AssembleError at the end.
+
+        If dataset_cache (a cache.DatasetCache) is set, the source dataframes
+        are read from it where possible, rather than decoded.
     """
 
+    resource_attribute_ids = list(resource_attribute_ids)
     assembled_dataframes = []
+    errors = {}
 
     log.info("Retrieving data for resource attributes %s into %s ",
         resource_attribute_ids,
         source_scenario_ids)
 
-    for resource_attribute_id in resource_attribute_ids:
-        matching_rs_list = get_matching_resource_scenarios(client,
-                                                           resource_attribute_id,
-                                                           scenario_id,
-                                                           source_scenario_ids)
+    cache = ResolutionCache(client)
 
-        log.info("[RA %s] [Scenario IDS %s] [RS IDs %s]",
-            resource_attribute_id,
-            source_scenario_ids,
-            resource_attribute_id)
+    timings = {}
 
-        dataframes = extract_dataframes(matching_rs_list)
-
-        combined_dataframe = combine_dataframes(dataframes)
+    def assemble(resource_attribute_id):
+        ra_timings = {}
+        try:
+            return _assemble_dataframe(client, resource_attribute_id, scenario_id, source_scenario_ids,
+                                       cache, ra_timings, dataset_cache), ra_timings, None
+        except Exception as err:
+            if workers is None:
+                raise
+            log.exception("[RA %s] Unable to assemble dataframes", resource_attribute_id)
+            return None, ra_timings, err
+
+    results = ordered_map(assemble, resource_attribute_ids, workers=workers)
+    for resource_attribute_id, (combined_dataframe, ra_timings, err) in zip(resource_attribute_ids, results):
+        for phase, seconds in ra_timings.items():
+            timings[phase] = timings.get(phase, 0) + seconds
+        if err is not None:
+            errors[resource_attribute_id] = err
+        else:
+            assembled_dataframes.append(combined_dataframe)
 
-        update_resource_scenario(client, resource_attribute_id, scenario_id, combined_dataframe)
+    log.info("Lookups: %s", cache.stats())
+    if dataset_cache is not None:
+        log.info("Dataset cache: %s", dataset_cache.stats())
+    log.info("Time spent: %s", ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in timings.items()))
 
-        assembled_dataframes.append(combined_dataframe)
+    if len(errors) > 0:
+        raise AssembleError(errors, assembled_dataframes)
 
     return assembled_dataframes
+
+def _assemble_dataframe(client, resource_attribute_id, scenario_id, source_scenario_ids, cache=None,
+                        timings=None, dataset_cache=None):
+    """
+        Combine the dataframes of the resource attributes matching resource_attribute_id
+        in the source scenarios, and save the result to resource_attribute_id.
+        The time spent in each phase is added to timings, if it is passed in.
+    """
+    if timings is None:
+        timings = {}
+
+    start = time.perf_counter()
+
+    matching_rs_list = get_matching_resource_scenarios(client,
+                                                       resource_attribute_id,
+                                                       scenario_id,
+                                                       source_scenario_ids,
+                                                       cache=cache)
+
+    log.info("[RA %s] [Scenario IDS %s] [RS IDs %s]",
+        resource_attribute_id,
+        source_scenario_ids,
+        resource_attribute_id)
+
+    matched = time.perf_counter()
+
+    dataframes = extract_dataframes(matching_rs_list, dataset_cache=dataset_cache)
+
+    extracted = time.perf_counter()
+
+    combined_dataframe = combine_dataframes(dataframes, timings=timings)
+
+    combined = time.perf_counter()
+
+    update_resource_scenario(client, resource_attribute_id, scenario_id, combined_dataframe)
+
+    timings['match'] = timings.get('match', 0) + matched - start
+    timings['extract'] = timings.get('extract', 0) + extracted - matched
+    timings['write'] = timings.get('write', 0) + time.perf_counter() - combined
+
+    return combined_dataframe
@@ -0,0 +1,268 @@
+"""
+Writers for the (node name, attribute name, dataframe) triples produced by
+data.export_dataframes, which write to disk as the dataframes arrive rather
+than collecting the whole scenario in memory first.
+"""
+import os
+import re
+import shutil
+import tempfile
+from urllib.parse import quote
+import numpy
+import pandas
+from openpyxl import Workbook
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+import logging
+log = logging.getLogger(__name__)
+
+
+def make_sheet_name(name):
+    """ Replace the characters which can't be used in an Excel sheet name with underscores """
+    return re.sub('[^0-9a-zA-Z|+\-@#$^()_,.!]+', '_', name)
+
+
+class StreamingExcelWriter(object):
+    """
+        Write one sheet per attribute, with a column for each column of each node's
+        dataframe, without holding all the dataframes in memory.
+
+        Excel files can only be written a row at a time, so each column is
+        spooled to a temporary file as it is added, and the workbook is
+        written in blocks of rows, from memory-mapped columns, by `close`,
+        using openpyxl's write-only mode. Columns of python objects (strings,
+        for example) can't be memory-mapped, so they are spooled in blocks
+        of block_size rows, one file per block. The peak memory use is
+        therefore one block of rows, and the index of each sheet.
+
+        The layout is the same as DataFrame.to_excel for a dataframe with
+        (node name, column) columns: two header rows, then the index and the data.
+    """
+    def __init__(self, filename, block_size=5000, tmp_dir=None):
+        self.filename = filename
+        self.block_size = block_size
+        self._spool_dir = tempfile.mkdtemp(dir=tmp_dir)
+        self._sheets = {}
+        self._num_columns = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if exc_type is None:
+                self.close()
+        finally:
+            shutil.rmtree(self._spool_dir, ignore_errors=True)
+
+    def add(self, node_name, attribute_name, df):
+        """ Add a node's dataframe to the sheet of its attribute. """
+        sheet = self._sheets.setdefault(attribute_name, {'index': None, 'columns': []})
+
+        #Dataframes with rows which aren't in the sheet yet add them to the end of
+        #the sheet's index, so every spooled column is aligned to the start of it.
+        if sheet['index'] is None:
+            sheet['index'] = df.index
+        elif not df.index.equals(sheet['index']):
+            new_labels = df.index.difference(sheet['index'], sort=False)
+            if len(new_labels) > 0:
+                sheet['index'] = sheet['index'].append(new_labels)
+            df = df.reindex(sheet['index'])
+
+        for column in df.columns:
+            values = df[column].to_numpy()
+            path = os.path.join(self._spool_dir, str(self._num_columns))
+            if values.dtype == object:
+                for block_num, start in enumerate(range(0, len(values), self.block_size)):
+                    numpy.save(f'{path}-{block_num}.npy', values[start:start + self.block_size],
+                               allow_pickle=True)
+            else:
+                numpy.save(f'{path}.npy', values, allow_pickle=False)
+            self._num_columns += 1
+            sheet['columns'].append((node_name, column, path, values.dtype == object))
+
+    def close(self):
+        """ Write the workbook. """
+        workbook = Workbook(write_only=True)
+
+        for attribute_name, sheet in self._sheets.items():
+            worksheet = workbook.create_sheet(make_sheet_name(attribute_name))
+            self._write_sheet(worksheet, sheet)
+            log.info("Wrote %s columns to sheet %s", len(sheet['columns']), attribute_name)
+
+        if len(self._sheets) == 0:
+            workbook.create_sheet()
+
+        workbook.save(self.filename)
+
+    def _write_sheet(self, worksheet, sheet):
+        columns = sheet['columns']
+        index = sheet['index']
+
+        worksheet.append([None] + [node_name for node_name, _, _, _ in columns])
+        worksheet.append([None] + [column for _, column, _, _ in columns])
+
+        #The numeric columns are memory-mapped once for the sheet
+        mapped_columns = {path: numpy.load(f'{path}.npy', mmap_mode='r')
+                          for _, _, path, is_object in columns if not is_object}
+
+        for block_num, start in enumerate(range(0, len(index), self.block_size)):
+            end = start + self.block_size
+
+            block = [index[start:end].tolist()]
+            for _, _, path, is_object in columns:
+                if is_object:
+                    values = _load_block(path, block_num)
+                else:
+                    values = mapped_columns[path][start:end].tolist()
+                #columns added before the sheet's index grew are shorter than it
+                values.extend([None] * (len(block[0]) - len(values)))
+                block.append(values)
+
+            for row in zip(*block):
+                worksheet.append([None if v != v else v for v in row])
+
+
+def _load_block(path, block_num):
+    """
+        Load a block of a column of python objects, which was spooled by this
+        writer, or an empty list if the column ends before the block.
+    """
+    block_path = f'{path}-{block_num}.npy'
+    if not os.path.exists(block_path):
+        return []
+    return numpy.load(block_path, allow_pickle=True).tolist()
+
+
+class ColumnarWriter(object):
+    """
+        Write exported dataframes in long format, with one row per value:
+        (node, attribute, index, column, value).
+
+        With format='parquet', `path` is a directory containing a Parquet dataset
+        partitioned by attribute (`attribute=<name>/part-0.parquet`), which can be read
+        with pyarrow.dataset.dataset(path, partitioning='hive'). With format='arrow',
+        `path` is a single Arrow IPC file, which can be memory-mapped with
+        pyarrow.ipc.open_file(pyarrow.memory_map(path)).
+
+        Rows are buffered per partition, and each buffer is written as one row group
+        (or record batch). Once row_group_size rows are buffered, over all the
+        partitions, the largest buffers are written until there are fewer, so memory
+        use is bounded by row_group_size however many attributes there are. Values
+        which aren't numeric are written as null.
+    """
+    def __init__(self, path, format='parquet', compression=None, row_group_size=1000000):
+        if pyarrow is None:
+            raise ImportError("pyarrow is required to export to parquet or arrow files.")
+
+        if format not in ('parquet', 'arrow'):
+            raise ValueError(f'Format "{format}" not supported. It must be "parquet" or "arrow".')
+
+        self.path = path
+        self.format = format
+        self.compression = compression
+        self.row_group_size = row_group_size
+
+        self.schema = pyarrow.schema([
+            ('node', pyarrow.string()),
+            ('attribute', pyarrow.string()),
+            ('index', pyarrow.string()),
+            ('column', pyarrow.string()),
+            ('value', pyarrow.float64()),
+        ])
+
+        #partition key -> writer, and its buffered record batches
+        self._writers = {}
+        self._buffers = {}
+        self._buffered_rows = {}
+        self._total_buffered_rows = 0
+
+        if format == 'parquet':
+            os.makedirs(path, exist_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def add(self, node_name, attribute_name, df):
+        """ Add the values in a node's dataframe. """
+        num_rows = len(df.index) * len(df.columns)
+        if num_rows == 0:
+            return
+
+        index = df.index.astype(str).to_numpy(dtype=object)
+        values = numpy.concatenate([pandas.to_numeric(df[column], errors='coerce').to_numpy(dtype=float)
+                                    for column in df.columns])
+
+        batch = pyarrow.record_batch([
+            pyarrow.array([node_name] * num_rows, pyarrow.string()),
+            pyarrow.array([attribute_name] * num_rows, pyarrow.string()),
+            pyarrow.array(numpy.tile(index, len(df.columns)), pyarrow.string()),
+            pyarrow.array(numpy.repeat(df.columns.astype(str).to_numpy(dtype=object), len(df.index)),
+                          pyarrow.string()),
+            pyarrow.array(values, pyarrow.float64(), from_pandas=True),
+        ], schema=self.schema)
+
+        key = attribute_name if self.format == 'parquet' else None
+
+        self._buffers.setdefault(key, []).append(batch)
+        self._buffered_rows[key] = self._buffered_rows.get(key, 0) + num_rows
+        self._total_buffered_rows += num_rows
+
+        while self._total_buffered_rows >= self.row_group_size:
+            self._flush(max(self._buffered_rows, key=self._buffered_rows.get))
+
+    def close(self):
+        """ Write any buffered rows and close the files. """
+        for key in list(self._buffers):
+            self._flush(key)
+
+        if self.format == 'arrow' and None not in self._writers:
+            #Write an empty file, so there is always something to read
+            self._get_writer(None)
+
+        for writer in self._writers.values():
+            writer.close()
+        self._writers = {}
+
+    def _flush(self, key):
+        batches = self._buffers.pop(key, [])
+        self._total_buffered_rows -= self._buffered_rows.pop(key, 0)
+        if len(batches) == 0:
+            return
+
+        table = pyarrow.Table.from_batches(batches, schema=self.schema)
+        writer = self._get_writer(key)
+
+        if self.format == 'parquet':
+            writer.write_table(table.drop(['attribute']), row_group_size=len(table))
+        else:
+            for batch in table.combine_chunks().to_batches():
+                writer.write_batch(batch)
+
+        log.info("Wrote %s rows to %s", len(table), self.path if key is None else key)
+
+    def _get_writer(self, key):
+        if key in self._writers:
+            return self._writers[key]
+
+        if self.format == 'parquet':
+            partition_dir = os.path.join(self.path, f'attribute={quote(key, safe="")}')
+            os.makedirs(partition_dir, exist_ok=True)
+            writer = pyarrow.parquet.ParquetWriter(os.path.join(partition_dir, 'part-0.parquet'),
+                                                   self.schema.remove(self.schema.get_field_index('attribute')),
+                                                   compression=self.compression or 'none')
+        else:
+            options = pyarrow.ipc.IpcWriteOptions(compression=self.compression)
+            writer = pyarrow.ipc.new_file(self.path, self.schema, options=options)
+
+        self._writers[key] = writer
+        return writer
@@ -1,26 +1,144 @@
 import fiona
+import json
 import os
 import math
-from shapely.geometry import Polygon, shape
+import time
+import numpy
+from shapely.geometry import LineString, Polygon, shape
+
+try:
+    from shapely import GeometryType, from_ragged_array, get_x, get_y, point_on_surface
+except ImportError:
+    #shapely < 2 has no vectorised functions, so the bulk mode works feature by feature
+    from_ragged_array = None
+
+import logging
+log = logging.getLogger(__name__)
 
 
 def nearby_node(nodes, coordinates, distance):
-    """ Return a node that is within distance of coordinates. """
+    """ Return the nearest node that is within distance of coordinates. """
     x1, y1 = coordinates
+    nearest = None
+    nearest_distance = distance
     for node in nodes:
         x2, y2 = node['x'], node['y']
         d = math.sqrt((x1 - x2)**2 + (y1 - y2)**2)
-        if d <= distance:
-            return node
-    return None
+        if d < nearest_distance or (nearest is None and d <= distance):
+            nearest = node
+            nearest_distance = d
+    return nearest
+
+
+class NodeGrid(object):
+    """
+        A spatial index of nodes, for finding the nearest node within a fixed
+        distance of a point as nodes are added. The nodes are hashed into square
+        cells with sides of that distance, so any node within the distance of a
+        point is in the point's cell or one of the 8 around it, and a lookup
+        only measures the distance to the nodes in those 9 cells.
+    """
+    def __init__(self, distance):
+        self.distance = distance
+        #A distance of 0 only matches identical coordinates, which any cell size finds
+        self.cell_size = distance if distance > 0 else 1.0
+        self._cells = {}
+
+    def _cell(self, x, y):
+        return math.floor(x / self.cell_size), math.floor(y / self.cell_size)
+
+    def add(self, node):
+        cell = self._cell(node['x'], node['y'])
+        self._cells.setdefault(cell, []).append(node)
+
+    def nearest(self, coordinates):
+        """ Return the nearest node within the distance of coordinates, or None. """
+        x1, y1 = coordinates[0], coordinates[1]
+        cx, cy = self._cell(x1, y1)
+
+        nearest = None
+        nearest_distance = self.distance
+        for i in (cx - 1, cx, cx + 1):
+            for j in (cy - 1, cy, cy + 1):
+                for node in self._cells.get((i, j), ()):
+                    d = math.hypot(x1 - node['x'], y1 - node['y'])
+                    if d < nearest_distance or (nearest is None and d <= self.distance):
+                        nearest = node
+                        nearest_distance = d
+        return nearest
+
+
+class ImportProgress(object):
+    """
+        Count the features read and the nodes and links imported from a file,
+        and report them, with the rate at which features are being imported,
+        each time a chunk or batch is done.
+
+        It is quiet by default: the progress is only logged at debug level,
+        unless `report`, a function which takes the message (such as print
+        or click.echo), is passed in.
+    """
+    def __init__(self, name, report=None):
+        self.name = name
+        self.report = report
+        self.features = 0
+        self.nodes = 0
+        self.links = 0
+        self._start = time.perf_counter()
+
+    def update(self, nodes=0, links=0):
+        self.nodes += nodes
+        self.links += links
+
+        message = (f'{self.name}: {self.features} features read, {self.nodes} nodes and '
+                   f'{self.links} links imported ({self.rate():.0f} features/s)')
+        log.debug(message)
+        if self.report is not None:
+            self.report(message)
+
+    def rate(self):
+        elapsed = time.perf_counter() - self._start
+        return self.features / elapsed if elapsed > 0 else 0.0
+
+
+def _iter_chunks(items, chunk_size):
+    """ Yield lists of up to chunk_size items. If chunk_size is None, yield one list of all of them. """
+    if chunk_size is not None and chunk_size < 1:
+        raise ValueError(f"The chunk size must be at least 1, not {chunk_size}")
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if chunk_size is not None and len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if len(chunk) > 0:
+        yield chunk
 
 
 def import_links_from_shapefile(client, shapefile, network_id, node_template_type_id,
-                                link_template_type_id, node_merge_distance=None):
-
-    nodes = []
-    links = []
-
+                                link_template_type_id, node_merge_distance=None, chunk_size=None,
+                                progress=None, simplify_tolerance=None, coordinate_precision=None):
+    """
+        Create a link for each linestring feature of a shapefile, and a node at each
+        end of it, merging the nodes within node_merge_distance of each other.
+
+        The features are read lazily, and if chunk_size is set, the links are added
+        chunk_size at a time, with the new nodes they connect. Links which end at a
+        node added with an earlier chunk use the node's database id, so only the
+        nodes are kept in memory between chunks, and only their names, ids and
+        coordinates. If chunk_size is None, all the nodes and links are added at once.
+        progress is an ImportProgress to report to after each chunk.
+
+        The vertices between the ends of each linestring are stored in the link's
+        layout. If simplify_tolerance is set, the linestring is first simplified
+        with the Douglas-Peucker algorithm (see simplify_line), and if
+        coordinate_precision is set, the stored vertices are rounded to that
+        many decimal places, to reduce the size of the network's layouts.
+        returns:
+            dict: The number of 'nodes' and 'links' added, and the size in bytes of
+                  the links' layout coordinates 'before' and 'after' they were
+                  simplified and rounded
+    """
     base, ext = os.path.splitext(os.path.basename(shapefile))
 
     node_name = f'{base}-node'
@@ -29,161 +147,388 @@ def import_links_from_shapefile(client, shapefile, network_id, node_template_typ
     node_id = -1
     link_id = -1
 
-    with fiona.open(shapefile) as src:
-        for feature in src:
-            geometry = feature['geometry']
-
-            if geometry['type'].lower() == "linestring":
-                coordinates = geometry['coordinates']
-            else:
-                raise ValueError('Only single part "linestring" geometries are supported!')
-
-            first_coordinate = coordinates.pop(0)
-            last_coordinate = coordinates.pop()
-
-            first_node = None
-            if node_merge_distance is not None:
-                first_node = nearby_node(nodes, first_coordinate, node_merge_distance)
-
-            if first_node is None:
-                first_node = {
-                    'id': node_id,
-                    'name': f'{node_name}-{-node_id}',
-                    'description': '',
-                    'layout': None,
-                    'x': first_coordinate[0],
-                    'y': first_coordinate[1],
+    node_grid = NodeGrid(node_merge_distance) if node_merge_distance is not None else None
+
+    if progress is None:
+        progress = ImportProgress(shapefile)
+
+    layout_size = {'before': 0, 'after': 0}
+
+    def read_links():
+        nonlocal node_id, link_id
+        with fiona.open(shapefile) as src:
+            for feature in src:
+                progress.features += 1
+                geometry = feature['geometry']
+
+                if geometry['type'].lower() == "linestring":
+                    coordinates = list(geometry['coordinates'])
+                else:
+                    raise ValueError('Only single part "linestring" geometries are supported!')
+
+                if simplify_tolerance is not None or coordinate_precision is not None:
+                    layout_size['before'] += _json_size(coordinates[1:-1])
+
+                    if simplify_tolerance is not None:
+                        coordinates = simplify_line(coordinates, simplify_tolerance)
+
+                    first_coordinate = coordinates[0]
+                    last_coordinate = coordinates[-1]
+                    coordinates = round_coordinates(coordinates[1:-1], coordinate_precision)
+
+                    layout_size['after'] += _json_size(coordinates)
+                else:
+                    first_coordinate = coordinates.pop(0)
+                    last_coordinate = coordinates.pop()
+
+                first_node = None
+                if node_merge_distance is not None:
+                    first_node = node_grid.nearest(first_coordinate)
+
+                if first_node is None:
+                    first_node = {
+                        'id': node_id,
+                        'name': f'{node_name}-{-node_id}',
+                        'description': '',
+                        'layout': None,
+                        'x': first_coordinate[0],
+                        'y': first_coordinate[1],
+                        'attributes': [],
+                        'types': [{'id': node_template_type_id}]
+                    }
+                    node_id -= 1
+                    if node_grid is not None:
+                        node_grid.add(first_node)
+
+                last_node = None
+                if node_merge_distance is not None:
+                    last_node = node_grid.nearest(last_coordinate)
+
+                if last_node is None:
+                    last_node = {
+                        'id': node_id,
+                        'name': f'{node_name}-{-node_id}',
+                        'description': '',
+                        'layout': None,
+                        'x': last_coordinate[0],
+                        'y': last_coordinate[1],
+                        'attributes': [],
+                        'types': [{'id': node_template_type_id}]
+                    }
+                    node_id -= 1
+                    if node_grid is not None:
+                        node_grid.add(last_node)
+
+                if last_node is first_node:
+                    raise ValueError('First nodes and last nodes are the same. The `node_merge_distance`'
+                                     ' is likely too high and has merged the nodes at the start and end'
+                                     ' of a link. Try lowering this value.')
+
+                link = {
+                    'id': link_id,
+                    'name': f'{link_name}-{-link_id}',
+                    'description': None,
+                    'layout': {
+                        'geojson': {
+                            'coordinates': coordinates
+                        }
+                    },
+                    'node_1': first_node,
+                    'node_2': last_node,
                     'attributes': [],
-                    'types': [{'id': node_template_type_id}]
+                    'types': [{'id': link_template_type_id}]
                 }
-                node_id -= 1
-                nodes.append(first_node)
+                link_id -= 1
+                yield link
+
+    for links in _iter_chunks(read_links(), chunk_size):
+        # The nodes which haven't been added yet still have their temporary (negative) id
+        nodes = list({node['id']: node for link in links for node in (link['node_1'], link['node_2'])
+                      if node['id'] < 0}.values())
+
+        # Add the nodes to the network, and update them with the correct database ids
+        if len(nodes) > 0:
+            added_nodes = client.add_nodes(network_id, nodes)
+            remap_node_ids(nodes, added_nodes)
+
+        # Only the nodes' ids and coordinates are needed to connect and merge later links
+        for node in nodes:
+            for key in ('description', 'layout', 'attributes', 'types'):
+                node.pop(key, None)
+
+        for link in links:
+            link['node_1_id'] = link.pop('node_1')['id']
+            link['node_2_id'] = link.pop('node_2')['id']
+
+        client.add_links(network_id, links)
+
+        progress.update(nodes=len(nodes), links=len(links))
+
+    if simplify_tolerance is not None or coordinate_precision is not None:
+        log.info("Link layout coordinates reduced from %s to %s bytes",
+                 layout_size['before'], layout_size['after'])
+
+    return {'nodes': progress.nodes, 'links': progress.links,
+            'before': layout_size['before'], 'after': layout_size['after']}
+
+
+def simplify_line(coordinates, tolerance):
+    """
+        Simplify a linestring with the Douglas-Peucker algorithm (shapely's
+        simplify without preserve_topology): vertices are removed where the
+        line stays within tolerance of the original. The first and last
+        coordinates are always kept as they are.
+        returns:
+            list of coordinates
+    """
+    if len(coordinates) <= 2:
+        return list(coordinates)
+    return list(LineString(coordinates).simplify(tolerance, preserve_topology=False).coords)
+
+
+def round_coordinates(coordinates, precision=None):
+    """ Round a list of coordinates to precision decimal places, if precision isn't None. """
+    if precision is None or len(coordinates) == 0:
+        return [list(c) for c in coordinates]
+    return numpy.round(numpy.asarray(coordinates, dtype=float), precision).tolist()
+
+
+def _json_size(coordinates):
+    return len(json.dumps([list(c) for c in coordinates]))
+
+
+def remap_node_ids(nodes, hydra_nodes):
+    """
+        Replace the temporary (negative) id of each node with the database id of
+        the node with the same name in hydra_nodes, as returned by add_nodes,
+        using an index of hydra_nodes by name.
+
+        Names which appear more than once in either list are logged, and the
+        first node with a name is used. If any of the nodes aren't in
+        hydra_nodes, a ValueError listing them is raised.
+    """
+    ids = {}
+    duplicate_names = set()
+    for hydra_node in hydra_nodes:
+        if hydra_node['name'] in ids:
+            duplicate_names.add(hydra_node['name'])
+        else:
+            ids[hydra_node['name']] = hydra_node['id']
 
-            last_node = None
-            if node_merge_distance is not None:
-                last_node = nearby_node(nodes, last_coordinate, node_merge_distance)
+    if len(duplicate_names) > 0:
+        log.warning('%s node names appear more than once in the database: %s',
+                    len(duplicate_names), ', '.join(sorted(duplicate_names)[:10]))
 
-            if last_node is None:
-                last_node = {
-                    'id': node_id,
-                    'name': f'{node_name}-{-node_id}',
-                    'description': '',
-                    'layout': None,
-                    'x': last_coordinate[0],
-                    'y': last_coordinate[1],
-                    'attributes': [],
-                    'types': [{'id': node_template_type_id}]
-                }
-                node_id -= 1
-                nodes.append(last_node)
-
-            if last_node == first_node:
-                raise ValueError('First nodes and last nodes are the same. The `node_merge_distance`'
-                                 ' is likely too high and has merged the nodes at the start and end'
-                                 ' of a link. Try lowering this value.')
-
-            link = {
-                'id': link_id,
-                'name': f'{link_name}-{-link_id}',
-                'description': None,
-                'layout': {
-                    'geojson': {
-                        'coordinates': coordinates
-                    }
-                },
-                'node_1': first_node,
-                'node_2': last_node,
-                'attributes': [],
-                'types': [{'id': link_template_type_id}]
-            }
-            link_id -= 1
-            links.append(link)
-
-    # Add the nodes to the network
-    all_nodes = client.add_nodes(network_id, nodes)
-
-    # Update the nodes with the correct database ids
+    missing_names = []
+    seen_names = set()
+    duplicate_names = set()
     for node in nodes:
-        for hydra_node in all_nodes:
-            if hydra_node['name'] == node['name']:
-                node['id'] = hydra_node['id']
-                break
+        if node['name'] in seen_names:
+            duplicate_names.add(node['name'])
+        seen_names.add(node['name'])
+
+        hydra_id = ids.get(node['name'])
+        if hydra_id is None:
+            missing_names.append(node['name'])
         else:
-            raise ValueError('Node name "{}" not found in returned nodes '
-                             'from the database.'.format(node['name']))
+            node['id'] = hydra_id
 
-    for link in links:
-        node_1 = link.pop('node_1')
-        link['node_1_id'] = node_1['id']
-        node_2 = link.pop('node_2')
-        link['node_2_id'] = node_2['id']
+    if len(duplicate_names) > 0:
+        log.warning('%s node names appear more than once in the imported nodes: %s',
+                    len(duplicate_names), ', '.join(sorted(duplicate_names)[:10]))
 
-    client.add_links(network_id, links)
+    if len(missing_names) > 0:
+        raise ValueError('{} node names not found in returned nodes from the database: {}'.format(
+            len(missing_names), ', '.join(f'"{name}"' for name in missing_names[:10])))
 
 
-def import_nodes_from_shapefile(shapefile, node_template_type_id, name_attributes=None):
+def get_projection(shapefile):
+    """ Return the name of the projection of a shapefile, or None if it doesn't have one. """
+    with fiona.open(shapefile) as src:
+        try:
+            return src.crs['proj']
+        except KeyError:
+            return None
 
-    nodes = []
+
+def iter_nodes_from_shapefile(shapefile, node_template_type_id, name_attributes=None, progress=None,
+                              batch_size=None):
+    """
+        Yield a node for each point, polygon or multipolygon feature of a shapefile,
+        reading the features lazily. For polygons, the node is at a representative
+        point of the polygon, and the polygon is kept in the node's layout.
+        If progress (an ImportProgress) is passed in, it counts the features read.
+
+        If batch_size is set, the features are read batch_size at a time, and the
+        representative points of each batch's polygons are computed together,
+        by representative_points.
+    """
+    if batch_size is not None and batch_size < 1:
+        raise ValueError(f"batch_size must be at least 1, not {batch_size}")
 
     base, ext = os.path.splitext(os.path.basename(shapefile))
 
     node_id = -1
 
     with fiona.open(shapefile) as src:
+        features = _read_node_features(src, progress)
 
-        try:
-            projection = src.crs['proj']
-        except KeyError:
-            projection = None
-
-        for feature in src:
+        for batch in _iter_chunks(features, batch_size if batch_size is not None else 1):
+            polygons = [geometry for _, geometry in batch if geometry['type'].lower() != 'point']
+            if batch_size is not None:
+                points = iter(representative_points(polygons))
+            else:
+                points = (shape(geometry).representative_point().coords[0] for geometry in polygons)
 
-            geometry = feature['geometry']
-            geometry_type = geometry['type'].lower()
+            for properties, geometry in batch:
+                geometry_type = geometry['type'].lower()
 
-            if name_attributes is None:
-                name = f'{base}-node-{-node_id}'
-            else:
-                name = '_'.join(str(feature['properties'][a]) for a in name_attributes)
-                if name == '':
+                if name_attributes is None:
                     name = f'{base}-node-{-node_id}'
+                else:
+                    name = '_'.join(str(properties[a]) for a in name_attributes)
+                    if name == '':
+                        name = f'{base}-node-{-node_id}'
+
+                if geometry_type == "point":
+                    point = geometry['coordinates']
+                    coordinates = None
+                else:
+                    point = next(points)
+                    coordinates = geometry['coordinates']
+
+                node = {
+                    'id': node_id,
+                    'name': name,
+                    'description': '',
+                    'layout': None,
+                    'x': float(point[0]),
+                    'y': float(point[1]),
+                    'attributes': [],
+                    'types': [{'id': node_template_type_id}]
+                }
+                node_id -= 1
 
-            if geometry_type == "point":
-                point = geometry['coordinates']
-                coordinates = None
-                geometry_type = None
-            elif geometry_type in ("polygon", "multipolygon"):
-                coordinates = geometry['coordinates']
-                point = shape(geometry).representative_point()
-                point = point.coords[0]
-
-            else:
-                continue
-                #raise NotImplementedError('Geometry type "{}" not supported!'.format(geometry['type']))
-
-            print(feature['properties'])
-
-            node = {
-                'id': node_id,
-                'name': name,
-                'description': '',
-                'layout': None,
-                'x': point[0],
-                'y': point[1],
-                'attributes': [],
-                'types': [{'id': node_template_type_id}]
-            }
-            node_id -= 1
-
-            nodes.append(node)
-
-            if coordinates is not None:
-                node['layout'] = {
-                    'geojson': {
-                        'type': geometry_type,
-                        'coordinates': coordinates
+                if coordinates is not None:
+                    node['layout'] = {
+                        'geojson': {
+                            'type': geometry_type,
+                            'coordinates': coordinates
+                        }
                     }
-                }
 
-    return nodes, projection
+                yield node
+
+
+def _read_node_features(src, progress=None):
+    """ Yield the (properties, geometry) of the point, polygon and multipolygon features. """
+    for feature in src:
+        if progress is not None:
+            progress.features += 1
+
+        geometry = feature['geometry']
+        if geometry['type'].lower() not in ("point", "polygon", "multipolygon"):
+            continue
+            #raise NotImplementedError('Geometry type "{}" not supported!'.format(geometry['type']))
+
+        yield feature['properties'], geometry
+
+
+def representative_points(geometries):
+    """
+        Compute a representative point (a point inside it) of each of a list of
+        polygon or multipolygon geojson geometries, as shapely's representative_point
+        does. With shapely 2, the polygons are built as arrays of geometries directly
+        from their coordinates, and the points are computed in one vectorised call
+        for each geometry type, rather than a shapely object being made per geometry.
+        returns:
+            numpy array: The (x, y) of each point
+    """
+    points = numpy.empty((len(geometries), 2))
+
+    if from_ragged_array is None:
+        for i, geometry in enumerate(geometries):
+            points[i] = shape(geometry).representative_point().coords[0]
+        return points
+
+    for multi in (False, True):
+        positions = [i for i, geometry in enumerate(geometries)
+                     if (geometry['type'].lower() == 'multipolygon') == multi]
+        if len(positions) == 0:
+            continue
+
+        rings = []
+        ring_offsets = [0]
+        polygon_offsets = [0]
+        geometry_offsets = [0]
+        for i in positions:
+            coordinates = geometries[i]['coordinates']
+            for polygon in (coordinates if multi else [coordinates]):
+                for ring in polygon:
+                    ring = numpy.asarray(ring, dtype=float)[:, :2]
+                    rings.append(ring)
+                    ring_offsets.append(ring_offsets[-1] + len(ring))
+                polygon_offsets.append(len(ring_offsets) - 1)
+            geometry_offsets.append(len(polygon_offsets) - 1)
+
+        if multi:
+            geometry_type = GeometryType.MULTIPOLYGON
+            offsets = (ring_offsets, polygon_offsets, geometry_offsets)
+        else:
+            geometry_type = GeometryType.POLYGON
+            offsets = (ring_offsets, polygon_offsets)
+
+        polygons = from_ragged_array(geometry_type, numpy.concatenate(rings),
+                                     tuple(numpy.asarray(o, dtype=numpy.int64) for o in offsets))
+        surface_points = point_on_surface(polygons)
+        points[positions, 0] = get_x(surface_points)
+        points[positions, 1] = get_y(surface_points)
+
+    return points
+
+
+def import_nodes_from_shapefile(shapefile, node_template_type_id, name_attributes=None, batch_size=None,
+                                progress=None):
+    """
+        Create a node for each point, polygon or multipolygon feature of a shapefile.
+        If batch_size is set, the features are processed in vectorised batches
+        of that many (see iter_nodes_from_shapefile). progress is an ImportProgress
+        to report to after each batch.
+        returns:
+            (list, str): The nodes, and the name of the shapefile's projection
+    """
+    if progress is None:
+        progress = ImportProgress(shapefile)
 
+    nodes = []
+    for batch in _iter_chunks(iter_nodes_from_shapefile(shapefile, node_template_type_id,
+                                                        name_attributes=name_attributes,
+                                                        progress=progress, batch_size=batch_size),
+                              batch_size):
+        nodes.extend(batch)
+        progress.update(nodes=len(batch))
+
+    return nodes, get_projection(shapefile)
+
+
+def add_nodes_from_shapefile(client, shapefile, network_id, node_template_type_id, name_attributes=None,
+                             chunk_size=1000, batch_size=None, progress=None):
+    """
+        Add a node to a network for each point, polygon or multipolygon feature of
+        a shapefile, as import_nodes_from_shapefile creates them, reading the
+        features lazily and adding the nodes chunk_size at a time.
+        batch_size and progress are as for import_nodes_from_shapefile.
+        returns:
+            int: The number of nodes added
+    """
+    if progress is None:
+        progress = ImportProgress(shapefile)
+
+    nodes = iter_nodes_from_shapefile(shapefile, node_template_type_id, name_attributes=name_attributes,
+                                      progress=progress, batch_size=batch_size)
+
+    for chunk in _iter_chunks(nodes, chunk_size):
+        client.add_nodes(network_id, chunk)
+        progress.update(nodes=len(chunk))
+
+    return progress.nodes
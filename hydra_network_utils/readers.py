@@ -0,0 +1,110 @@
+"""
+Functions for reading the tabular files which are imported into hydra.
+"""
+import pandas
+
+import logging
+log = logging.getLogger(__name__)
+
+
+def _get_index_position(columns, index_col):
+    """
+        Find the position of the index column in a file's header. index_col
+        can be a column name, a position, or a string of a position.
+    """
+    if index_col is None:
+        return None
+
+    if isinstance(index_col, str) and index_col not in columns:
+        try:
+            index_col = int(index_col)
+        except ValueError:
+            raise ValueError(f'Index column "{index_col}" not found.')
+
+    if isinstance(index_col, int):
+        return index_col
+
+    return columns.index(index_col)
+
+
+def read_csv(filename, index_col=None, engine=None, date_format=None, parse_dates=True, **kwargs):
+    """
+        Read a CSV file with an index of dates.
+        args:
+            filename (str): The CSV file
+            index_col (int or str): The name or position of the index column
+            engine (str): The pandas parser to use: 'c' (the default), 'python' or
+                          'pyarrow', which is multithreaded and needs pyarrow installed.
+            date_format (str): The strftime format of the dates in the index. If it is
+                               given, the index is parsed with it in one vectorised step,
+                               rather than the format being inferred row by row.
+            parse_dates (bool): Parse the index as dates, if date_format isn't given.
+            Other keyword arguments are passed to pandas.read_csv
+        returns:
+            pandas dataframe
+    """
+    if isinstance(index_col, str):
+        columns = list(pandas.read_csv(filename, nrows=0, usecols=kwargs.get('usecols')).columns)
+        index_col = _get_index_position(columns, index_col)
+
+    if index_col is None or (date_format is None and engine != 'pyarrow'):
+        return pandas.read_csv(filename, index_col=index_col, engine=engine,
+                               parse_dates=parse_dates and index_col is not None, **kwargs)
+
+    dataframe = pandas.read_csv(filename, index_col=index_col, engine=engine, **kwargs)
+
+    if date_format is not None:
+        dataframe.index = pandas.to_datetime(dataframe.index, format=date_format)
+    elif parse_dates and dataframe.index.dtype == object:
+        #The same as read_csv's parse_dates; an index which isn't dates is left alone
+        try:
+            dataframe.index = pandas.to_datetime(dataframe.index)
+        except (TypeError, ValueError):
+            pass
+
+    return dataframe
+
+
+def iter_csv_column_groups(filename, group_size, index_col=None, parse_dates=True, engine=None,
+                           date_format=None):
+    """
+        Read a CSV file a group of columns at a time, so only one group's data
+        is in memory at once. Each group is read with its own pass over the file,
+        using usecols.
+        args:
+            filename (str): The CSV file
+            group_size (int): The maximum number of data columns in each group
+            index_col (int or str): The name or position of the index column, which is in every group
+            parse_dates (bool): Parse the index as dates, as pandas.read_csv does
+            engine (str): The pandas parser to use, as for read_csv
+            date_format (str): The strftime format of the dates in the index, as for read_csv
+        yields:
+            pandas dataframe
+    """
+    if group_size < 1:
+        raise ValueError(f"group_size must be at least 1, not {group_size}")
+
+    columns = list(pandas.read_csv(filename, nrows=0).columns)
+
+    index_position = _get_index_position(columns, index_col)
+
+    data_positions = [i for i in range(len(columns)) if i != index_position]
+
+    num_groups = (len(data_positions) + group_size - 1) // group_size
+
+    for group_num, start in enumerate(range(0, len(data_positions), group_size), 1):
+        positions = data_positions[start:start + group_size]
+
+        #The columns are selected by name, as the pyarrow engine doesn't accept positions
+        if index_position is None:
+            dataframe = read_csv(filename, usecols=[columns[i] for i in positions], engine=engine)
+        else:
+            used_positions = sorted(positions + [index_position])
+            #index_col refers to the position among the columns which are read
+            dataframe = read_csv(filename, usecols=[columns[i] for i in used_positions],
+                                 index_col=used_positions.index(index_position),
+                                 parse_dates=parse_dates, engine=engine, date_format=date_format)
+
+        log.info("Read column group %s/%s (%s columns)", group_num, num_groups, len(positions))
+
+        yield dataframe
@@ -57,13 +57,14 @@ def export_coordinates(client, network_ids, data_dir='/tmp'):
 
     print(f"Node coordinates written to {output_filename}")
 
-def apply_coordinates(client, filename, network_ids=None):
+def apply_coordinates(client, filename, network_ids=None, engine=None):
     """
-        Apply coordinates specified in a file to the nodes in the specified network
+        Apply coordinates specified in a file to the nodes in the specified network.
+        engine is the pandas CSV parser to use ('c', 'python' or 'pyarrow').
     """
 
     if filename.endswith('csv'):
-        coordinate_df = pd.read_csv(filename)
+        coordinate_df = pd.read_csv(filename, engine=engine)
     elif filename.endswith('xlsx'):
         coordinate_df = pd.read_excel(filename)
     else:
@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from fixtures import *
+from hydra_base.util.testing import create_dataframe
+from hydra_network_utils import aio
+from hydra_network_utils import data
+import asyncio
+import threading
+import time
+import pytest
+import pandas as pd
+
+class StandInClient(object):
+    """ A client whose requests take a little time, and which records how many overlap. """
+    def __init__(self):
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def get_resource_scenario(self, resource_attr_id, scenario_id):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(0.01)
+        with self._lock:
+            self.in_flight -= 1
+        return {'resource_attr_id': resource_attr_id, 'scenario_id': scenario_id}
+
+class TestAsyncHydraClient:
+    def test_concurrency_is_limited(self):
+        """
+            Requests run concurrently, but no more than max_concurrency at once,
+            and their results come back in order.
+        """
+        stand_in_client = StandInClient()
+
+        async def fetch_all():
+            async with aio.AsyncHydraClient(stand_in_client, max_concurrency=4) as aclient:
+                async def fetch(resource_attr_id):
+                    return await aclient.get_resource_scenario(resource_attr_id, 1)
+                return [rs async for rs in aio.ordered_map(fetch, range(40), window=8)]
+
+        results = asyncio.run(fetch_all())
+
+        assert [rs['resource_attr_id'] for rs in results] == list(range(40))
+        assert 1 < stand_in_client.max_in_flight <= 4
+
+    def test_reuse_across_event_loops(self):
+        """
+            The adapter can be used by one event loop after another, and
+            closing it from a coroutine waits for the requests in flight.
+        """
+        stand_in_client = StandInClient()
+        aclient = aio.AsyncHydraClient(stand_in_client, max_concurrency=2)
+
+        async def fetch(resource_attr_id):
+            return await aclient.get_resource_scenario(resource_attr_id, 1)
+
+        assert asyncio.run(fetch(1))['resource_attr_id'] == 1
+        assert asyncio.run(fetch(2))['resource_attr_id'] == 2
+
+        asyncio.run(aclient.aclose())
+
+        assert stand_in_client.in_flight == 0
+
+    def test_import_dataframe(self, session, client, projectmaker, networkmaker):
+        """
+            The async import writes the same data as data.import_dataframe.
+        """
+        project = projectmaker.create('Async Import Dataframe Project')
+
+        network = networkmaker.create(project_id=project.id)
+
+        scenario = network.scenarios[0]
+
+        node = network.nodes[0]
+
+        ra = node.attributes[0]
+
+        existing_df = create_dataframe(ra,
+                                       dataframe_value = {"test_column":
+                                                            {
+                                                                'key1': 1,
+                                                                'key2': 2,
+                                                                'key3': 3
+                                                            }
+                                                         }
+                                      )
+
+        hydra_base.update_resourcedata(scenario.id, [existing_df], user_id=pytest.root_user_id)
+
+        dataframe = pd.DataFrame({node.name: [10, 20, 30]}, index=['key1', 'key2', 'key3'])
+
+        async def import_dataframe():
+            #The test database session can't be shared between threads
+            async with aio.AsyncHydraClient(client, max_concurrency=1) as aclient:
+                return await aio.import_dataframe(aclient, dataframe, network.id, scenario.id,
+                                                  ra.attr_id, chunk_size=1)
+
+        result = asyncio.run(import_dataframe())
+
+        assert result['written'] == [node.name]
+        assert result['failed'] == []
+
+        updated_scenario = client.get_scenario(scenario.id)
+
+        for rs in updated_scenario.resourcescenarios:
+            if rs.resource_attr_id == ra.id:
+                updated_df = data.json_to_df(rs.dataset.value)
+                assert updated_df['test_column']['key2'] == 20
+                break
+        else:
+            raise AssertionError("Dataset not found")
+
+    def test_export_dataframes(self, session, client, projectmaker, networkmaker):
+        """
+            The async export yields the same dataframes, in the same order, as
+            data.export_dataframes, whatever the page size.
+        """
+        project = projectmaker.create('Async Export Dataframes Project')
+
+        network = networkmaker.create(project_id=project.id)
+
+        scenario = network.scenarios[0]
+
+        exported = list(data.export_dataframes(client, network.id, scenario.id))
+
+        async def export_dataframes():
+            async with aio.AsyncHydraClient(client, max_concurrency=1) as aclient:
+                return [exported async for exported in aio.export_dataframes(aclient, network.id, scenario.id,
+                                                                             page_size=3)]
+
+        async_exported = asyncio.run(export_dataframes())
+
+        assert [(name, attr_name) for name, attr_name, _ in async_exported] == \
+            [(name, attr_name) for name, attr_name, _ in exported]
+        for (_, _, async_df), (_, _, df) in zip(async_exported, exported):
+            pd.testing.assert_frame_equal(async_df, df)
+
+    def test_assemble_dataframes(self, session, client, projectmaker, networkmaker):
+        """
+            The async assembly combines the source scenarios' dataframes and saves
+            them on the target scenario, as data.assemble_dataframes does.
+        """
+        project = projectmaker.create('Async Assemble Project')
+
+        target_network = networkmaker.create(project_id=project.id)
+        target_ra = target_network.nodes[0].attributes[0]
+        target_scenario = target_network.scenarios[0]
+
+        source_scenario_ids = []
+        for value in (1, 10):
+            source_network = networkmaker.create(project_id=project.id)
+            source_scenario = source_network.scenarios[0]
+            source_df = create_dataframe(source_network.nodes[0].attributes[0],
+                                         dataframe_value = {"test_column": {'key1': value}})
+            hydra_base.update_resourcedata(source_scenario.id, [source_df], user_id=pytest.root_user_id)
+            source_scenario_ids.append(source_scenario.id)
+
+        async def assemble_dataframes():
+            async with aio.AsyncHydraClient(client, max_concurrency=1) as aclient:
+                return await aio.assemble_dataframes(aclient, [target_ra.id], target_scenario.id,
+                                                     source_scenario_ids)
+
+        combined_dataframes = asyncio.run(assemble_dataframes())
+
+        combined_df = data.json_to_df(combined_dataframes[0].value)
+        assert [combined_df[f'test_column_{s_id}']['key1'] for s_id in source_scenario_ids] == [1, 10]
+
+        updated_scenario = client.get_scenario(target_scenario.id)
+
+        for rs in updated_scenario.resourcescenarios:
+            if rs.resource_attr_id == target_ra.id:
+                assert rs.dataset.value == combined_dataframes[0].value
+                break
+        else:
+            raise AssertionError("Dataset not found")
@@ -4,6 +4,7 @@
 from fixtures import *
 from hydra_base.util.testing import create_dataframe
 from hydra_network_utils import data
+import numpy
 import pytest
 import pandas as pd
 
@@ -69,3 +70,96 @@ class TestAssembleDataframes:
         for rs in updated_scenario.resourcescenarios:
             if rs.resource_attr_id == target_ra.id:
                 assert rs.dataset.value == combined_dataframes[0].value
+
+    def test_failed_resource_attributes_are_collected(self, session, client, projectmaker, networkmaker):
+        """
+            With workers, a resource attribute which can't be assembled doesn't stop
+            the others being assembled and saved, and the failures are raised together.
+        """
+
+        project = projectmaker.create('Assemble Errors Project')
+
+        target_network = networkmaker.create(project_id=project.id)
+
+        source_network = networkmaker.create(project_id=project.id)
+
+        source_scenario = source_network.scenarios[0]
+
+        source_ra = source_network.nodes[0].attributes[0]
+
+        source_df = create_dataframe(source_ra,
+                                     dataframe_value = {"test_column":
+                                                          {
+                                                              'key1': 1,
+                                                              'key2': 2,
+                                                              'key3': 3
+                                                          }
+                                                       }
+                                    )
+
+        hydra_base.update_resourcedata(source_scenario.id, [source_df], user_id=pytest.root_user_id)
+
+        target_node = target_network.nodes[0]
+        target_ra = target_node.attributes[0]
+        target_scenario = target_network.scenarios[0]
+
+        #An attribute which the source network's nodes don't have, so it can't be matched
+        unmatched_attr = client.add_attribute({'name': 'Unmatched Attribute'})
+        unmatched_ra = client.add_resource_attribute('NODE', target_node.id, unmatched_attr.id, 'N')
+
+        #The test database session can't be shared between threads, so there is one worker
+        with pytest.raises(data.AssembleError) as error:
+            data.assemble_dataframes(client,
+                                     [unmatched_ra.id, target_ra.id],
+                                     target_scenario.id,
+                                     [source_scenario.id],
+                                     workers=1)
+
+        assert list(error.value.errors) == [unmatched_ra.id]
+        assert len(error.value.assembled_dataframes) == 1
+
+        updated_scenario = client.get_scenario(target_scenario.id)
+
+        for rs in updated_scenario.resourcescenarios:
+            if rs.resource_attr_id == target_ra.id:
+                assert rs.dataset.value == error.value.assembled_dataframes[0].value
+                break
+        else:
+            raise AssertionError("Dataset not found")
+
+class TestCombineDataframes:
+    def test_same_index_matches_concat(self):
+        """
+            Dataframes with the same index, of one dtype or of several, are combined
+            into the same json as pandas.concat produces.
+        """
+        index = pd.Index(['key1', 'key2', 'key3'], dtype=object)
+
+        single_dtype = [
+            pd.DataFrame({'a_1': [1.5, 2.5, numpy.nan]}, index=index),
+            pd.DataFrame({'a_2': [10.0, 20.0, 30.0], 'b_2': [0.1, 0.2, 0.3]}, index=index),
+        ]
+
+        mixed_dtypes = [
+            pd.DataFrame({'a_1': [1.5, 2.5, numpy.nan], 'b_1': [1, 2, 3]}, index=index),
+            pd.DataFrame({'a_2': ['x', 'y', None], 'b_2': [True, False, True]}, index=index),
+        ]
+
+        for dataframes in (single_dtype, mixed_dtypes):
+            combined_dataset = data.combine_dataframes(dataframes)
+            assert combined_dataset.value == data.df_to_json(pd.concat(dataframes, axis=1))
+
+    def test_different_indices_are_aligned(self):
+        """
+            Dataframes with different indices are aligned on the union of the indices.
+        """
+        dataframes = [
+            pd.DataFrame({'a_1': [1.0, 2.0]}, index=['key1', 'key2']),
+            pd.DataFrame({'a_2': [20.0, 30.0]}, index=['key2', 'key3']),
+        ]
+
+        combined_df = data.json_to_df(data.combine_dataframes(dataframes).value)
+
+        assert list(combined_df.index) == ['key1', 'key2', 'key3']
+        assert combined_df['a_2']['key2'] == 20.0
+        assert numpy.isnan(combined_df['a_1']['key3'])
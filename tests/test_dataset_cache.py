@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from hydra_network_utils import cache
+from hydra_network_utils import data
+import json
+import os
+import numpy
+import pandas as pd
+
+class TestDatasetCache:
+    def test_hit_after_put(self, tmpdir):
+        """
+            A cached dataset is returned without being decoded, and a dataset
+            whose hash has changed is a miss.
+        """
+        dataset_cache = cache.DatasetCache(str(tmpdir))
+        df = pd.DataFrame({"a": numpy.arange(10.0)}, index=[str(i) for i in range(10)])
+        dataset = {"id": 1, "hash": 123, "value": data.df_to_json(df)}
+
+        assert dataset_cache.get(dataset) is None
+        dataset_cache.put(dataset, df)
+
+        #A new cache on the same directory sees the entry
+        dataset_cache = cache.DatasetCache(str(tmpdir))
+        cached_df = dataset_cache.get(dict(dataset, value=None))
+        pd.testing.assert_frame_equal(cached_df, df)
+
+        assert dataset_cache.get(dict(dataset, hash=456)) is None
+        assert dataset_cache.stats()["hits"] == 1
+
+    def test_least_recently_used_are_evicted(self, tmpdir):
+        """
+            When the cache is over its maximum size, the least recently
+            used entries are deleted.
+        """
+        df = pd.DataFrame({"a": numpy.random.rand(1000)})
+        dataset_cache = cache.DatasetCache(str(tmpdir), max_size=1024**2)
+        dataset_cache.put({"id": 0, "hash": 0}, df)
+        entry_size = dataset_cache.stats()["bytes"]
+
+        dataset_cache = cache.DatasetCache(str(tmpdir), max_size=entry_size * 2)
+        dataset_cache.put({"id": 1, "hash": 1}, df)
+        dataset_cache.get({"id": 0, "hash": 0})
+        dataset_cache.put({"id": 2, "hash": 2}, df)
+
+        assert sorted(os.listdir(str(tmpdir))) == ["0-0.npz", "2-2.npz"]
+
+    def test_mixed_columns_round_trip(self, tmpdir):
+        """
+            Columns of strings and mixed values come back as they were cached.
+        """
+        dataset_cache = cache.DatasetCache(str(tmpdir))
+        df = data.json_to_df(json.dumps({
+            "flow": {"a": 1.5, "b": None},
+            "name": {"a": "x", "b": None},
+            "mixed": {"a": 1, "b": [1, 2]},
+        }))
+        dataset = {"id": 1, "hash": 123}
+
+        dataset_cache.put(dataset, df)
+        cached_df = dataset_cache.get(dataset)
+
+        pd.testing.assert_frame_equal(cached_df, df)
+
+    def test_pickles_are_not_loaded(self, tmpdir):
+        """
+            An entry containing pickled objects is a miss, rather than being unpickled.
+        """
+        dataset_cache = cache.DatasetCache(str(tmpdir))
+        numpy.savez(os.path.join(str(tmpdir), "1-123.npz"),
+                    index=numpy.array(["a"]), columns=numpy.array(["a"]),
+                    values_0=numpy.array([object()], dtype=object))
+
+        assert dataset_cache.get({"id": 1, "hash": 123}) is None
+        assert dataset_cache.stats()["misses"] == 1
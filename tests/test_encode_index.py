@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from hydra_network_utils import data
+import pandas as pd
+
+class TestEncodeIndex:
+    def test_matches_astype_str(self):
+        """
+            Indices are encoded to the same strings as index.astype(str).
+        """
+        indices = [
+            pd.date_range("2000-01-01", periods=10, freq="D"),
+            pd.date_range("2000-01-01", periods=10, freq="h", name="time"),
+            pd.DatetimeIndex(["2000-01-01 03:00", None]),
+            pd.date_range("2000-01-01", periods=10, freq="500ms"),
+            pd.date_range("2000-01-01", periods=10, freq="h", tz="UTC"),
+            pd.Index([1, 2, 3]),
+        ]
+
+        for index in indices:
+            encoded_index = data.encode_index(index)
+            assert list(encoded_index) == list(index.astype(str))
+            assert encoded_index.name == index.name
+
+    def test_shared_index_is_encoded_once(self):
+        """
+            The columns of a dataframe share its index, so they reuse its encoding.
+        """
+        df = pd.DataFrame({"a": range(24), "b": range(24)},
+                          index=pd.date_range("2000-01-01", periods=24, freq="h"))
+
+        encoded_index = data.encode_index(df["a"].index)
+
+        assert data.encode_index(df["b"].index) is encoded_index
+        assert data.encode_index(encoded_index) is encoded_index
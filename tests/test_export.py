@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from hydra_network_utils import data
+from hydra_network_utils import export
+import json
+import os
+import threading
+import time
+import openpyxl
+import pytest
+import pandas as pd
+
+class TestStreamingExcelWriter:
+    def test_round_trip(self, tmpdir):
+        """
+            Each attribute gets a sheet with (node, column) headers. Rows which only
+            some of the nodes have are added to the end of the sheet's index, and the
+            other nodes' columns are left empty, over several blocks of rows.
+        """
+        filename = os.path.join(str(tmpdir), 'export.xlsx')
+
+        with export.StreamingExcelWriter(filename, block_size=2, tmp_dir=str(tmpdir)) as writer:
+            writer.add('node1', 'flow', pd.DataFrame({'a': [1.0, 2.0, 3.0], 'b': ['x', 'y', None]},
+                                                     index=['d1', 'd2', 'd3']))
+            writer.add('node2', 'flow', pd.DataFrame({'a': [4.0, 5.0]}, index=['d3', 'd4']))
+            writer.add('node1', 'cost/unit', pd.DataFrame({'a': [7]}, index=['d1']))
+
+        workbook = openpyxl.load_workbook(filename)
+
+        assert workbook.sheetnames == ['flow', 'cost_unit']
+
+        assert list(workbook['flow'].values) == [
+            (None, 'node1', 'node1', 'node2'),
+            (None, 'a', 'b', 'a'),
+            ('d1', 1, 'x', None),
+            ('d2', 2, 'y', None),
+            ('d3', 3, None, 4),
+            ('d4', None, None, 5),
+        ]
+
+        assert list(workbook['cost_unit'].values) == [
+            (None, 'node1'),
+            (None, 'a'),
+            ('d1', 7),
+        ]
+
+        #The spooled columns are removed
+        assert os.listdir(str(tmpdir)) == ['export.xlsx']
+
+    def test_empty(self, tmpdir):
+        """
+            A workbook with nothing in it still has a sheet, so it can be opened.
+        """
+        filename = os.path.join(str(tmpdir), 'export.xlsx')
+
+        with export.StreamingExcelWriter(filename, tmp_dir=str(tmpdir)):
+            pass
+
+        assert len(openpyxl.load_workbook(filename).sheetnames) == 1
+
+class TestColumnarWriter:
+    def test_parquet_round_trip(self, tmpdir):
+        """
+            Each attribute is a hive partition, written in row groups of at most
+            row_group_size rows, and the values read back in long format.
+        """
+        pyarrow = pytest.importorskip('pyarrow')
+        import pyarrow.dataset
+        import pyarrow.parquet
+
+        path = os.path.join(str(tmpdir), 'export.parquet')
+
+        with export.ColumnarWriter(path, format='parquet', row_group_size=4) as writer:
+            writer.add('node1', 'flow', pd.DataFrame({'a': [1.0, 2.0], 'b': [3.0, 4.0]}, index=['d1', 'd2']))
+            writer.add('node2', 'flow', pd.DataFrame({'a': [5.0, 'x']}, index=['d1', 'd2']))
+            writer.add('node1', 'cost/unit', pd.DataFrame({'a': [7]}, index=['d1']))
+
+        assert sorted(os.listdir(path)) == ['attribute=cost%2Funit', 'attribute=flow']
+
+        flow_file = pyarrow.parquet.ParquetFile(os.path.join(path, 'attribute=flow', 'part-0.parquet'))
+        assert flow_file.num_row_groups == 2
+
+        table = pyarrow.dataset.dataset(path, partitioning='hive').to_table()
+        df = table.to_pandas().sort_values(['attribute', 'node', 'column', 'index'])
+
+        assert [tuple(row) for row in df[['node', 'attribute', 'index', 'column']].values] == [
+            ('node1', 'cost/unit', 'd1', 'a'),
+            ('node1', 'flow', 'd1', 'a'),
+            ('node1', 'flow', 'd2', 'a'),
+            ('node1', 'flow', 'd1', 'b'),
+            ('node1', 'flow', 'd2', 'b'),
+            ('node2', 'flow', 'd1', 'a'),
+            ('node2', 'flow', 'd2', 'a'),
+        ]
+        #Values which aren't numeric are null
+        assert df['value'].tolist()[:-1] == [7.0, 1.0, 2.0, 3.0, 4.0, 5.0]
+        assert pd.isnull(df['value'].tolist()[-1])
+
+    def test_buffer_is_bounded_over_partitions(self, tmpdir):
+        """
+            Attributes which each have fewer than row_group_size rows don't stay
+            buffered until the end: fewer than row_group_size rows are buffered
+            over all of them, and they are all written.
+        """
+        pytest.importorskip('pyarrow')
+        import pyarrow.dataset
+
+        path = os.path.join(str(tmpdir), 'export.parquet')
+
+        with export.ColumnarWriter(path, format='parquet', row_group_size=10) as writer:
+            for node_num in range(5):
+                for attr_num in range(4):
+                    writer.add(f'node{node_num}', f'attr{attr_num}',
+                               pd.DataFrame({'a': [1.0, 2.0, 3.0]}, index=['d1', 'd2', 'd3']))
+                    assert writer._total_buffered_rows < 10
+
+        table = pyarrow.dataset.dataset(path, partitioning='hive').to_table()
+
+        assert table.num_rows == 5 * 4 * 3
+
+    def test_arrow_round_trip(self, tmpdir):
+        """
+            An Arrow file contains every attribute's rows, and can be memory-mapped.
+        """
+        pyarrow = pytest.importorskip('pyarrow')
+        import pyarrow.ipc
+
+        path = os.path.join(str(tmpdir), 'export.arrow')
+
+        with export.ColumnarWriter(path, format='arrow', row_group_size=2) as writer:
+            writer.add('node1', 'flow', pd.DataFrame({'a': [1.0, 2.0]}, index=['d1', 'd2']))
+            writer.add('node1', 'cost', pd.DataFrame({'a': [7.0]}, index=['d1']))
+
+        table = pyarrow.ipc.open_file(pyarrow.memory_map(path)).read_all()
+
+        assert table.column('attribute').to_pylist() == ['flow', 'flow', 'cost']
+        assert table.column('value').to_pylist() == [1.0, 2.0, 7.0]
+
+    def test_empty_arrow_file(self, tmpdir):
+        """
+            An Arrow file is written, with no rows, even if there is nothing to export.
+        """
+        pyarrow = pytest.importorskip('pyarrow')
+        import pyarrow.ipc
+
+        path = os.path.join(str(tmpdir), 'export.arrow')
+
+        with export.ColumnarWriter(path, format='arrow'):
+            pass
+
+        table = pyarrow.ipc.open_file(pyarrow.memory_map(path)).read_all()
+
+        assert table.num_rows == 0
+        assert table.schema.names == ['node', 'attribute', 'index', 'column', 'value']
+
+class StandInClient(object):
+    """
+        A client with a network of nodes which each have one dataframe, whose data
+        requests take a little time, and which records how many overlap.
+    """
+    def __init__(self, num_nodes):
+        self.nodes = [{'id': i, 'name': f'node{i}', 'attributes': [{'id': 100 + i, 'attr_id': 1}]}
+                      for i in range(num_nodes)]
+        self.requested_ids = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def get_scenario(self, scenario_id, include_data=True):
+        return {'id': scenario_id, 'network_id': 1}
+
+    def get_nodes(self, network_id):
+        return self.nodes
+
+    def get_attribute_by_id(self, attr_id):
+        return {'id': attr_id, 'name': 'flow'}
+
+    def get_attributes_for_resource(self, network_id, scenario_id, ref_key, ref_ids=None):
+        with self._lock:
+            self.requested_ids.append(ref_ids)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(0.01)
+        with self._lock:
+            self.in_flight -= 1
+        return [{'resource_attr_id': 100 + i,
+                 'dataset': {'type': 'DATAFRAME', 'value': json.dumps({'a': {'d1': i}})}}
+                for i in ref_ids]
+
+class TestExportDataframes:
+    def test_pages_with_workers(self):
+        """
+            The data is requested a page of nodes at a time, several pages at once with
+            workers, and the dataframes come out in the order of the nodes either way.
+        """
+        client = StandInClient(10)
+
+        exported = list(data.export_dataframes(client, 1, 1, page_size=3))
+
+        assert client.requested_ids == [[0, 1, 2], [3, 4, 5], [6, 7, 8], [9]]
+        assert [name for name, _, _ in exported] == [f'node{i}' for i in range(10)]
+        assert [df['a']['d1'] for _, _, df in exported] == list(range(10))
+        assert client.max_in_flight == 1
+
+        client = StandInClient(10)
+
+        concurrent = list(data.export_dataframes(client, 1, 1, page_size=3, workers=2))
+
+        assert [(name, attr_name) for name, attr_name, _ in concurrent] == \
+            [(name, attr_name) for name, attr_name, _ in exported]
+        assert client.max_in_flight == 2
@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from hydra_network_utils import gis
+import fiona
+import random
+import pytest
+from shapely.geometry import shape
+
+class TestNodeGrid:
+    def test_nearest_node_is_found(self):
+        """
+            The nearest node within the distance is returned, even if another
+            node within the distance was added first.
+        """
+        grid = gis.NodeGrid(1.0)
+        far_node = {'x': 0.9, 'y': 0.0}
+        near_node = {'x': -0.2, 'y': 0.1}
+        grid.add(far_node)
+        grid.add(near_node)
+        grid.add({'x': 5.0, 'y': 5.0})
+
+        assert grid.nearest((0.0, 0.0)) is near_node
+        assert grid.nearest((2.5, 2.5)) is None
+
+    def test_matches_linear_scan(self):
+        """
+            The grid finds the same nodes as checking the distance to every node.
+        """
+        random.seed(1)
+        nodes = [{'x': random.uniform(-50, 50), 'y': random.uniform(-50, 50)} for _ in range(500)]
+
+        grid = gis.NodeGrid(3.0)
+        for node in nodes:
+            grid.add(node)
+
+        for _ in range(500):
+            coordinates = (random.uniform(-55, 55), random.uniform(-55, 55))
+            assert grid.nearest(coordinates) is gis.nearby_node(nodes, coordinates, 3.0)
+
+class TestRemapNodeIds:
+    def test_ids_are_remapped_by_name(self):
+        """
+            Each node gets the id of the database node with the same name,
+            and any nodes missing from the database are reported together.
+        """
+        nodes = [{'id': -1, 'name': 'a'}, {'id': -2, 'name': 'b'}]
+        gis.remap_node_ids(nodes, [{'id': 20, 'name': 'b'}, {'id': 10, 'name': 'a'}, {'id': 30, 'name': 'c'}])
+
+        assert [node['id'] for node in nodes] == [10, 20]
+
+        nodes = [{'id': -1, 'name': 'a'}, {'id': -2, 'name': 'x'}, {'id': -3, 'name': 'y'}]
+        with pytest.raises(ValueError, match='2 node names .* "x", "y"'):
+            gis.remap_node_ids(nodes, [{'id': 10, 'name': 'a'}])
+
+class TestRepresentativePoints:
+    def test_matches_shapely(self):
+        """
+            The points computed together are the same as shapely's
+            representative_point for each polygon or multipolygon.
+        """
+        square = [(0, 0), (4, 0), (4, 4), (0, 4), (0, 0)]
+        hole = [(1, 1), (1, 3), (3, 3), (3, 1), (1, 1)]
+        geometries = [
+            {'type': 'Polygon', 'coordinates': [square]},
+            {'type': 'MultiPolygon', 'coordinates': [[square, hole], [[(10, 10), (11, 10), (11, 11), (10, 10)]]]},
+            {'type': 'Polygon', 'coordinates': [square, hole]},
+        ]
+
+        points = gis.representative_points(geometries)
+
+        for geometry, point in zip(geometries, points):
+            assert tuple(point) == pytest.approx(shape(geometry).representative_point().coords[0])
+
+    def test_batch_size_must_be_positive(self):
+        """
+            A batch size of less than one is refused before the file is read.
+        """
+        with pytest.raises(ValueError):
+            list(gis.iter_nodes_from_shapefile('missing.shp', 1, batch_size=0))
+
+class TestSimplifyLine:
+    def test_ends_are_kept(self):
+        """
+            Vertices within the tolerance of a straighter line are removed, but
+            the ends of the line, where its nodes are, are kept exactly.
+        """
+        coordinates = [(0.0, 0.0), (1.0, 0.01), (2.0, -0.01), (3.0, 2.0), (4.0, 0.0)]
+
+        simplified = gis.simplify_line(coordinates, 0.1)
+
+        assert simplified == [(0.0, 0.0), (2.0, -0.01), (3.0, 2.0), (4.0, 0.0)]
+        assert gis.round_coordinates(simplified[1:-1], 1) == [[2.0, 0.0], [3.0, 2.0]]
+
+class StandInClient(object):
+    """ Records the nodes and links added, giving each node a database id. """
+    def __init__(self):
+        self.node_ids = {}
+        self.links = []
+        self.requests = 0
+
+    def add_nodes(self, network_id, nodes):
+        self.requests += 1
+        added_nodes = []
+        for node in nodes:
+            self.node_ids[node['name']] = len(self.node_ids) + 1
+            added_nodes.append({'id': self.node_ids[node['name']], 'name': node['name']})
+        return added_nodes
+
+    def add_links(self, network_id, links):
+        self.requests += 1
+        self.links.extend(links)
+
+class TestImportLinks:
+    def test_links_are_added_in_chunks(self, tmpdir):
+        """
+            Links added in later chunks connect to the merged nodes
+            which were added with earlier chunks.
+        """
+        shapefile = str(tmpdir.join('river.shp'))
+        schema = {'geometry': 'LineString', 'properties': {'n': 'int'}}
+        with fiona.open(shapefile, 'w', driver='ESRI Shapefile', schema=schema) as dst:
+            for i in range(5):
+                dst.write({'geometry': {'type': 'LineString', 'coordinates': [(i, 0), (i + 0.5, 1), (i + 1, 0)]},
+                           'properties': {'n': i}})
+
+        client = StandInClient()
+        gis.import_links_from_shapefile(client, shapefile, 1, 1, 2, node_merge_distance=0.1, chunk_size=2)
+
+        assert client.requests == 6
+        assert len(client.node_ids) == 6
+        assert [(link['node_1_id'], link['node_2_id']) for link in client.links] == \
+            [(1, 2), (2, 3), (3, 4), (4, 5), (5, 6)]
+
+    def test_chunk_size_must_be_positive(self):
+        """
+            A chunk size of less than one is refused, rather than adding a request per link.
+        """
+        with pytest.raises(ValueError):
+            list(gis._iter_chunks(range(5), 0))
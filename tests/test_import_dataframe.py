@@ -0,0 +1,325 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from fixtures import *
+from hydra_base.util.testing import create_dataframe
+from hydra_network_utils import data
+from hydra_network_utils.cli import read_sheet_attributes
+import os
+import pytest
+import pandas as pd
+
+class TestImportDataframe:
+    def test_import_dataframe(self, session, client, projectmaker, networkmaker):
+        """
+            Update an existing dataframe on a node using a column of a dataframe
+            whose name matches the node.
+        """
+
+        project = projectmaker.create('Import Dataframe Project')
+
+        network = networkmaker.create(project_id=project.id)
+
+        scenario = network.scenarios[0]
+
+        node = network.nodes[0]
+
+        ra = node.attributes[0]
+
+        existing_df = create_dataframe(ra,
+                                       dataframe_value = {"test_column":
+                                                            {
+                                                                'key1': 1,
+                                                                'key2': 2,
+                                                                'key3': 3
+                                                            }
+                                                         }
+                                      )
+
+        hydra_base.update_resourcedata(scenario.id, [existing_df], user_id=pytest.root_user_id)
+
+        dataframe = pd.DataFrame({node.name: [10, 20, 30]}, index=['key1', 'key2', 'key3'])
+
+        result = data.import_dataframe(client,
+                                       dataframe,
+                                       network.id,
+                                       scenario.id,
+                                       ra.attr_id,
+                                       chunk_size=1)
+
+        assert result['written'] == [node.name]
+        assert result['failed'] == []
+
+        updated_scenario = client.get_scenario(scenario.id)
+
+        for rs in updated_scenario.resourcescenarios:
+            if rs.resource_attr_id == ra.id:
+                updated_df = data.json_to_df(rs.dataset.value)
+                assert list(updated_df.columns) == ['test_column']
+                assert updated_df['test_column']['key2'] == 20
+                break
+        else:
+            raise AssertionError("Dataset not found")
+
+    def test_import_unchanged_dataframe(self, session, client, projectmaker, networkmaker):
+        """
+            Importing the same data twice with skip_unchanged only writes it the first time.
+        """
+
+        project = projectmaker.create('Import Unchanged Dataframe Project')
+
+        network = networkmaker.create(project_id=project.id)
+
+        scenario = network.scenarios[0]
+
+        node = network.nodes[0]
+
+        ra = node.attributes[0]
+
+        existing_df = create_dataframe(ra,
+                                       dataframe_value = {"test_column":
+                                                            {
+                                                                'key1': 1,
+                                                                'key2': 2,
+                                                                'key3': 3
+                                                            }
+                                                         }
+                                      )
+
+        hydra_base.update_resourcedata(scenario.id, [existing_df], user_id=pytest.root_user_id)
+
+        dataframe = pd.DataFrame({node.name: [10, 20, 30]}, index=['key1', 'key2', 'key3'])
+
+        result = data.import_dataframe(client, dataframe, network.id, scenario.id, ra.attr_id,
+                                       skip_unchanged=True)
+
+        assert result['written'] == [node.name]
+        assert result['skipped'] == []
+
+        result = data.import_dataframe(client, dataframe, network.id, scenario.id, ra.attr_id,
+                                       skip_unchanged=True)
+
+        assert result['written'] == []
+        assert result['skipped'] == [node.name]
+
+    def test_import_and_export_link_dataframe(self, session, client, projectmaker, networkmaker):
+        """
+            Dataframes on links are imported and exported in the same way as on nodes,
+            using columns named after the links.
+        """
+
+        project = projectmaker.create('Import Link Dataframe Project')
+
+        network = networkmaker.create(project_id=project.id)
+
+        scenario = network.scenarios[0]
+
+        link = network.links[0]
+
+        ra = link.attributes[0]
+
+        existing_df = create_dataframe(ra,
+                                       dataframe_value = {"test_column":
+                                                            {
+                                                                'key1': 1,
+                                                                'key2': 2,
+                                                                'key3': 3
+                                                            }
+                                                         }
+                                      )
+
+        hydra_base.update_resourcedata(scenario.id, [existing_df], user_id=pytest.root_user_id)
+
+        dataframe = pd.DataFrame({link.name: [10, 20, 30]}, index=['key1', 'key2', 'key3'])
+
+        result = data.import_dataframe(client, dataframe, network.id, scenario.id, ra.attr_id,
+                                       resource_type='LINK')
+
+        assert result['written'] == [link.name]
+
+        exported = list(data.export_dataframes(client, network.id, scenario.id,
+                                               attribute_ids=[ra.attr_id], resource_type='LINK'))
+
+        exported_df = {name: df for name, _, df in exported}[link.name]
+        assert exported_df['test_column']['key2'] == 20
+
+    def test_export_dataframes_in_pages(self, session, client, projectmaker, networkmaker):
+        """
+            The data is fetched a page of nodes at a time, and the dataframes are
+            exported in the order of the network's nodes, whatever the page size.
+        """
+
+        project = projectmaker.create('Export Pages Project')
+
+        network = networkmaker.create(project_id=project.id)
+
+        scenario = network.scenarios[0]
+
+        exported = list(data.export_dataframes(client, network.id, scenario.id))
+
+        node_names = [node.name for node in client.get_nodes(network.id)]
+        assert [name for name, _, _ in exported] == node_names
+
+        paged = list(data.export_dataframes(client, network.id, scenario.id, page_size=3))
+
+        assert [(name, attr_name) for name, attr_name, _ in paged] == \
+            [(name, attr_name) for name, attr_name, _ in exported]
+        for (_, _, paged_df), (_, _, df) in zip(paged, exported):
+            pd.testing.assert_frame_equal(paged_df, df)
+
+    def test_import_multiindex_dataframe(self, session, client, projectmaker, networkmaker):
+        """
+            A dataframe with (node, attribute) columns sets the single column of
+            each node's dataframe in several attributes at once, and one with
+            (node, attribute, column) columns sets or adds the named columns.
+        """
+
+        project = projectmaker.create('Import Multiindex Dataframe Project')
+
+        network = networkmaker.create(project_id=project.id)
+
+        scenario = network.scenarios[0]
+
+        node = network.nodes[0]
+
+        ra_1 = node.attributes[0]
+        ra_2 = node.attributes[1]
+
+        for ra in (ra_1, ra_2):
+            existing_df = create_dataframe(ra,
+                                           dataframe_value = {"test_column":
+                                                                {
+                                                                    'key1': 1,
+                                                                    'key2': 2,
+                                                                    'key3': 3
+                                                                }
+                                                             }
+                                          )
+
+            hydra_base.update_resourcedata(scenario.id, [existing_df], user_id=pytest.root_user_id)
+
+        attr_1 = client.get_attribute_by_id(ra_1.attr_id)
+        attr_2 = client.get_attribute_by_id(ra_2.attr_id)
+
+        def get_updated_dfs():
+            updated_scenario = client.get_scenario(scenario.id)
+            return {rs.resource_attr_id: data.json_to_df(rs.dataset.value)
+                    for rs in updated_scenario.resourcescenarios
+                    if rs.resource_attr_id in (ra_1.id, ra_2.id)}
+
+        index = ['key1', 'key2', 'key3']
+
+        columns = pd.MultiIndex.from_tuples([(node.name, str(ra_1.attr_id)),
+                                             (node.name, str(ra_2.attr_id))])
+        dataframe = pd.DataFrame([[10, 100], [20, 200], [30, 300]], index=index, columns=columns)
+
+        result = data.import_multiindex_dataframe(client, dataframe, scenario.id)
+
+        assert sorted(result['written']) == sorted([f"{node.name} ({attr_1.name})",
+                                                    f"{node.name} ({attr_2.name})"])
+        assert result['failed'] == []
+
+        updated_dfs = get_updated_dfs()
+        assert list(updated_dfs[ra_1.id].columns) == ['test_column']
+        assert list(updated_dfs[ra_1.id]['test_column']) == [10, 20, 30]
+        assert list(updated_dfs[ra_2.id]['test_column']) == [100, 200, 300]
+
+        columns = pd.MultiIndex.from_tuples([(node.name, str(ra_1.attr_id), 'test_column'),
+                                             (node.name, str(ra_1.attr_id), 'new_column'),
+                                             (node.name, str(ra_2.attr_id), 'new_column')])
+        dataframe = pd.DataFrame([[11, 12, 13], [21, 22, 23], [31, 32, 33]], index=index, columns=columns)
+
+        result = data.import_multiindex_dataframe(client, dataframe, scenario.id)
+
+        assert len(result['written']) == 2
+
+        updated_dfs = get_updated_dfs()
+        assert list(updated_dfs[ra_1.id].columns) == ['test_column', 'new_column']
+        assert list(updated_dfs[ra_1.id]['test_column']) == [11, 21, 31]
+        assert list(updated_dfs[ra_1.id]['new_column']) == [12, 22, 32]
+        #The column which isn't in the dataframe is left as it was
+        assert list(updated_dfs[ra_2.id].columns) == ['test_column', 'new_column']
+        assert list(updated_dfs[ra_2.id]['test_column']) == [100, 200, 300]
+        assert list(updated_dfs[ra_2.id]['new_column']) == [13, 23, 33]
+
+    def test_get_attribute_ids(self, session, client, projectmaker, networkmaker):
+        """
+            Attribute names are looked up among the attributes scoped to the
+            network, as well as global ones. IDs are used as they are.
+        """
+
+        project = projectmaker.create('Get Attribute IDs Project')
+
+        #Each network has its own attribute called "Network Scoped Attr"
+        networkmaker.create(project_id=project.id)
+        network = networkmaker.create(project_id=project.id)
+
+        for ra in network.attributes:
+            attribute = client.get_attribute_by_id(ra.attr_id)
+            if attribute.name == 'Network Scoped Attr':
+                break
+        else:
+            raise AssertionError("Network scoped attribute not found")
+
+        node_attr_id = network.nodes[0].attributes[0].attr_id
+
+        attribute_ids = data.get_attribute_ids(client, ['Network Scoped Attr', str(node_attr_id)],
+                                               network_id=network.id)
+
+        assert attribute_ids == {'Network Scoped Attr': attribute.id, str(node_attr_id): node_attr_id}
+
+    def test_import_sheets(self, session, client, projectmaker, networkmaker, tmpdir):
+        """
+            The sheets of a workbook are imported into the attributes they are
+            mapped to, with one prefetch and one write.
+        """
+
+        project = projectmaker.create('Import Sheets Project')
+
+        network = networkmaker.create(project_id=project.id)
+
+        scenario = network.scenarios[0]
+
+        node = network.nodes[0]
+
+        ra_1 = node.attributes[0]
+        ra_2 = node.attributes[1]
+
+        for ra in (ra_1, ra_2):
+            existing_df = create_dataframe(ra,
+                                           dataframe_value = {"test_column":
+                                                                {
+                                                                    'key1': 1,
+                                                                    'key2': 2,
+                                                                    'key3': 3
+                                                                }
+                                                             }
+                                          )
+
+            hydra_base.update_resourcedata(scenario.id, [existing_df], user_id=pytest.root_user_id)
+
+        filename = os.path.join(str(tmpdir), 'sheets.xlsx')
+        index = ['key1', 'key2', 'key3']
+        with pd.ExcelWriter(filename) as writer:
+            pd.DataFrame({node.name: [10, 20, 30]}, index=index).to_excel(writer, sheet_name='first')
+            pd.DataFrame({node.name: [100, 200, 300]}, index=index).to_excel(writer, sheet_name='second')
+
+        dataframes = read_sheet_attributes(client, filename, 0,
+                                           [f'first={ra_1.attr_id}', f'second={ra_2.attr_id}'], False,
+                                           network_id=network.id)
+
+        assert sorted(dataframes) == sorted([ra_1.attr_id, ra_2.attr_id])
+
+        result = data.import_dataframes(client, dataframes, scenario.id)
+
+        assert len(result['written']) == 2
+        assert result['failed'] == []
+
+        updated_scenario = client.get_scenario(scenario.id)
+
+        updated_dfs = {rs.resource_attr_id: data.json_to_df(rs.dataset.value)
+                       for rs in updated_scenario.resourcescenarios
+                       if rs.resource_attr_id in (ra_1.id, ra_2.id)}
+
+        assert list(updated_dfs[ra_1.id]['test_column']) == [10, 20, 30]
+        assert list(updated_dfs[ra_2.id]['test_column']) == [100, 200, 300]
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from hydra_network_utils import data
+import json
+import numpy
+import pandas as pd
+
+class TestJsonToDf:
+    def test_order_is_preserved(self):
+        """
+            The columns and the index come out in the order they are in the json,
+            not sorted.
+        """
+        json_dataframe = json.dumps({
+            "b": {"key2": 1, "key1": 2, "key3": 3},
+            "a": {"key2": 10, "key1": 20, "key3": 30},
+        })
+
+        df = data.json_to_df(json_dataframe)
+
+        assert list(df.columns) == ["b", "a"]
+        assert list(df.index) == ["key2", "key1", "key3"]
+        assert df["a"]["key1"] == 20
+
+    def test_matches_pandas_read_json(self):
+        """
+            The decoded values are the same as those from pandas.read_json
+        """
+        index = pd.date_range("2000-01-01", periods=100, freq="D").astype(str)
+        source_df = pd.DataFrame({
+            "flow": numpy.random.rand(100),
+            "count": numpy.arange(100),
+        }, index=index)
+        source_df.iloc[5, 0] = numpy.nan
+
+        df = data.json_to_df(source_df.to_json(orient="columns", double_precision=15))
+
+        assert list(df.index) == list(index)
+        assert df["count"].dtype == numpy.int64
+        assert numpy.isnan(df["flow"].iloc[5])
+        numpy.testing.assert_allclose(df["flow"].values, source_df["flow"].values)
+
+    def test_unaligned_columns(self):
+        """
+            Columns with different indices are aligned on the union of the indices.
+        """
+        json_dataframe = json.dumps({
+            "a": {"key1": 1, "key2": 2},
+            "b": {"key2": "x", "key3": "y"},
+        })
+
+        df = data.json_to_df(json_dataframe)
+
+        assert list(df.index) == ["key1", "key2", "key3"]
+        assert numpy.isnan(df["a"]["key3"])
+        assert df["b"]["key1"] is None
+        assert df["b"]["key3"] == "y"
+
+    def test_reordered_keys(self):
+        """
+            Columns with the same keys in a different order are aligned on the
+            keys, not on their positions.
+        """
+        json_dataframe = json.dumps({
+            "a": {"key1": 1, "key2": 2},
+            "b": {"key2": 20, "key1": 10},
+        })
+
+        df = data.json_to_df(json_dataframe)
+
+        assert list(df.index) == ["key1", "key2"]
+        assert list(df["b"]) == [10, 20]
+        assert df["b"]["key1"] == pd.read_json(json_dataframe)["b"]["key1"]
+
+    def test_date_index_is_normalised(self):
+        """
+            Timestamps in milliseconds, as DataFrame.to_json writes a DatetimeIndex,
+            and ISO datetimes decode to the same dates as pandas.read_json gives.
+            Keys which aren't all dates are left as they are.
+        """
+        source_df = pd.DataFrame({"flow": [1.0, 2.0]},
+                                 index=pd.to_datetime(["2020-01-01", "2020-01-02"]))
+
+        json_dataframe = source_df.to_json(orient="columns")
+        assert "1577836800000" in json_dataframe
+
+        df = data.json_to_df(json_dataframe)
+
+        assert list(df.index) == ["2020-01-01", "2020-01-02"]
+        assert list(df.index) == list(pd.read_json(json_dataframe).index.astype(str))
+        assert list(df["flow"]) == [1.0, 2.0]
+
+        iso_df = data.json_to_df(source_df.to_json(orient="columns", date_format="iso"))
+
+        assert list(iso_df.index) == ["2020-01-01", "2020-01-02"]
+
+        df = data.json_to_df(json.dumps({"a": {"1577836800000": 1, "key": 2},
+                                         "b": {"0": 1, "1": 2}}))
+
+        assert list(df.index) == ["1577836800000", "key", "0", "1"]
+
+    def test_pywr_value_round_trip(self):
+        """
+            A dataframe encoded as a pywr dataframe parameter keeps the other
+            entries of the value, and decodes to the same dataframe.
+        """
+        index = pd.date_range("2000-01-01", periods=48, freq="h")
+        source_df = pd.DataFrame({"flow": numpy.random.rand(48)}, index=index)
+
+        pywr_value = data.df_to_pywr_value(source_df, {"type": "dataframeparameter",
+                                                       "data": {},
+                                                       "pandas_kwargs": {"parse_dates": True}})
+
+        value = json.loads(pywr_value)
+        assert list(value.keys()) == ["type", "data", "pandas_kwargs"]
+        assert value["pandas_kwargs"] == {"parse_dates": True}
+
+        df = data.pywr_value_to_df(pywr_value)
+
+        assert list(df.index) == list(index.astype(str))
+        #to_json keeps 10 decimal places
+        numpy.testing.assert_allclose(df["flow"].values, source_df["flow"].values, rtol=0, atol=1e-10)
@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from hydra_network_utils import data
+
+class TestLookupCache:
+    def test_hits_and_misses(self):
+        """
+            Repeated lookups are served from the cache and counted as hits.
+        """
+        calls = []
+        def lookup(key):
+            calls.append(key)
+            return {'id': key}
+
+        cache = data.LookupCache(lookup)
+
+        for key in [1, 2, 1, 1, 2]:
+            assert cache(key)['id'] == key
+
+        assert calls == [1, 2]
+        assert cache.stats() == {'hits': 3, 'misses': 2, 'size': 2}
+
+    def test_size_is_bounded(self):
+        """
+            The least recently used entry is evicted when the cache is full.
+        """
+        calls = []
+        def lookup(key):
+            calls.append(key)
+            return key
+
+        cache = data.LookupCache(lookup, maxsize=2)
+
+        for key in [1, 2, 1, 3, 1, 2]:
+            cache(key)
+
+        #2 was evicted when 3 was added, as 1 had been used more recently
+        assert calls == [1, 2, 3, 2]
+        assert cache.stats()['size'] == 2
@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from hydra_network_utils import data
+import random
+import time
+
+class TestOrderedMap:
+    def test_results_are_in_order(self):
+        """
+            Results from a pool of workers come back in the order of the inputs,
+            however long each one takes.
+        """
+        def square(x):
+            time.sleep(random.random() / 100)
+            return x * x
+
+        results = list(data.ordered_map(square, range(50), workers=4))
+
+        assert results == [x * x for x in range(50)]
+
+    def test_submission_is_bounded(self):
+        """
+            Items are only taken from the input a few at a time ahead of the
+            result being consumed.
+        """
+        taken = []
+        def items():
+            for i in range(100):
+                taken.append(i)
+                yield i
+
+        results = data.ordered_map(lambda x: x, items(), workers=2)
+
+        assert next(results) == 0
+        assert len(taken) <= 4
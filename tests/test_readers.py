@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from hydra_network_utils import readers
+import os
+import pytest
+import pandas as pd
+
+@pytest.fixture()
+def csv_file(tmpdir):
+    """ A CSV file whose index of dates is its second column, between two node columns. """
+    filename = os.path.join(str(tmpdir), 'data.csv')
+    with open(filename, 'w') as f:
+        f.write('node1,date,node2,node3,node4\n'
+                '1,01/02/2000,10,100,1000\n'
+                '2,02/02/2000,20,200,2000\n'
+                '3,03/02/2000,30,300,3000\n')
+    return filename
+
+class TestReadCsv:
+    def test_date_format(self, csv_file):
+        """
+            The index is parsed with the date format, rather than one inferred from it.
+        """
+        df = readers.read_csv(csv_file, index_col='date', date_format='%d/%m/%Y')
+
+        assert list(df.index) == list(pd.date_range('2000-02-01', periods=3, freq='D'))
+        assert list(df.columns) == ['node1', 'node2', 'node3', 'node4']
+
+    def test_index_col(self, csv_file):
+        """
+            The index column can be given by name, by position, or by a string
+            of its position, as it is from the command line.
+        """
+        by_name = readers.read_csv(csv_file, index_col='date', date_format='%d/%m/%Y')
+        by_position = readers.read_csv(csv_file, index_col=1, date_format='%d/%m/%Y')
+        by_position_string = readers.read_csv(csv_file, index_col='1', date_format='%d/%m/%Y')
+
+        pd.testing.assert_frame_equal(by_position, by_name)
+        pd.testing.assert_frame_equal(by_position_string, by_name)
+
+        with pytest.raises(ValueError):
+            readers.read_csv(csv_file, index_col='missing')
+
+    def test_pyarrow_engine(self, csv_file):
+        """
+            The pyarrow parser reads the same dataframe as the default one.
+        """
+        pytest.importorskip('pyarrow')
+
+        expected = readers.read_csv(csv_file, index_col='date', date_format='%d/%m/%Y')
+
+        df = readers.read_csv(csv_file, index_col='date', date_format='%d/%m/%Y', engine='pyarrow')
+
+        pd.testing.assert_frame_equal(df, expected)
+
+        #Without a date format, the index is parsed as read_csv's parse_dates would
+        expected = readers.read_csv(csv_file, index_col='date')
+
+        df = readers.read_csv(csv_file, index_col='date', engine='pyarrow')
+
+        pd.testing.assert_frame_equal(df, expected)
+
+class TestIterCsvColumnGroups:
+    def test_groups(self, csv_file):
+        """
+            The file is read a few columns at a time, each group with the index,
+            and the groups together are the whole file.
+        """
+        groups = list(readers.iter_csv_column_groups(csv_file, 3, index_col='date', date_format='%d/%m/%Y'))
+
+        assert [list(group.columns) for group in groups] == [['node1', 'node2', 'node3'], ['node4']]
+
+        expected = readers.read_csv(csv_file, index_col='date', date_format='%d/%m/%Y')
+        pd.testing.assert_frame_equal(pd.concat(groups, axis=1), expected)
+
+    def test_groups_without_index(self, csv_file):
+        """
+            Without an index column, every column is data.
+        """
+        groups = list(readers.iter_csv_column_groups(csv_file, 2))
+
+        assert [list(group.columns) for group in groups] == [['node1', 'date'], ['node2', 'node3'], ['node4']]
+
+    def test_group_size_must_be_positive(self, csv_file):
+        """
+            A group size of less than one is refused, rather than reading no groups.
+        """
+        with pytest.raises(ValueError):
+            list(readers.iter_csv_column_groups(csv_file, 0))